@@ -1,17 +1,178 @@
+import datetime
+
+from django import forms
 from django.contrib import admin
-from .models import AirStation, AirQualityReading
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.functional import cached_property
+
+from .models import AirStation, AirQualityReading, Sensor
+
+# Filtered changelists count at most this many rows; narrow the filters to page further
+ADMIN_COUNT_LIMIT = 10_000
+
+
+class ReadingPaginator(Paginator):
+    """
+    Paginator for the readings changelist that never runs a full COUNT(*).
+    The unfiltered total is the sum of the station summaries, which
+    ingestion keeps up to date; filtered counts stop at ADMIN_COUNT_LIMIT.
+    """
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            return AirStation.objects.aggregate(total=Sum('reading_count'))['total'] or 0
+        return self.object_list.order_by().values('pk')[:ADMIN_COUNT_LIMIT].count()
+
+
+class StationFilter(admin.ListFilter):
+    """
+    Station filter with an autocomplete box (the admin's select2 widget,
+    searching AirStationAdmin) instead of a link per station.
+    """
+    title = 'station'
+    parameter_name = 'station__id__exact'
+    template = 'admin/airquality/station_filter.html'
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        self.model_admin = model_admin
+        if self.parameter_name in params:
+            self.used_parameters[self.parameter_name] = params.pop(self.parameter_name)[-1]
+
+    def value(self):
+        return self.used_parameters.get(self.parameter_name)
+
+    def has_output(self):
+        return True
+
+    def expected_parameters(self):
+        return [self.parameter_name]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        if not value.isdigit():
+            raise IncorrectLookupParameters(f'Invalid station id {value!r}.')
+        return queryset.filter(station_id=int(value))
+
+    def choices(self, changelist):
+        field = forms.ModelChoiceField(
+            AirStation.objects.all(), required=False,
+            widget=AutocompleteSelect(AirQualityReading._meta.get_field('station'), self.model_admin.admin_site),
+        )
+        self.widget = field.widget.render(self.parameter_name, self.value())
+        # The script adds the picked station to this query string
+        self.query_string = changelist.get_query_string(remove=[self.parameter_name, PAGE_VAR])
+        yield {
+            'selected': self.value() is None,
+            'query_string': self.query_string,
+            'display': 'All',
+        }
+
+
+class TimestampRangeFilter(admin.ListFilter):
+    """
+    From/to dates (inclusive, in the site time zone) as a timestamp range,
+    which the (station, timestamp) unique index serves together with the
+    station filter.
+    """
+    title = 'timestamp range'
+    parameters = ('timestamp_from', 'timestamp_to')
+    template = 'admin/airquality/timestamp_range_filter.html'
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        for name in self.parameters:
+            if name in params:
+                self.used_parameters[name] = params.pop(name)[-1]
+
+    def has_output(self):
+        return True
+
+    def expected_parameters(self):
+        return list(self.parameters)
+
+    def _bound(self, name):
+        value = self.used_parameters.get(name)
+        if not value:
+            return None
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise IncorrectLookupParameters(f'Invalid date {value!r}.')
+        return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+    def queryset(self, request, queryset):
+        start = self._bound('timestamp_from')
+        end = self._bound('timestamp_to')
+        if start is not None:
+            queryset = queryset.filter(timestamp__gte=start)
+        if end is not None:
+            queryset = queryset.filter(timestamp__lt=end + datetime.timedelta(days=1))
+        return queryset
+
+    def choices(self, changelist):
+        # The rest of the query string (other filters, search, ordering), carried through the GET form
+        self.hidden = [
+            (name, value) for name, value in changelist.params.items()
+            if name not in self.parameters and name != PAGE_VAR
+        ]
+        yield {
+            'selected': not self.used_parameters,
+            'query_string': changelist.get_query_string(remove=[*self.parameters, PAGE_VAR]),
+            'display': 'All',
+            'from': self.used_parameters.get('timestamp_from', ''),
+            'to': self.used_parameters.get('timestamp_to', ''),
+        }
+
 
 @admin.register(AirStation)
 class AirStationAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'location')
     search_fields = ('name', 'location')
+    # Also orders the station autocomplete results
+    ordering = ('name',)
+
+@admin.register(Sensor)
+class SensorAdmin(admin.ModelAdmin):
+    # Sensors added or changed here are picked up by ingestion and proxy/now/ without a deploy
+    list_display = ('id', 'station', 'type', 'label', 'active')
+    list_filter = ('type', 'active')
+    search_fields = ('=id', 'label', 'station__name')
+    list_select_related = ('station',)
+    autocomplete_fields = ('station',)
 
 @admin.register(AirQualityReading)
 class AirQualityReadingAdmin(admin.ModelAdmin):
     list_display = ('id', 'get_station_name', 'timestamp', 'pm25', 'pm1', 'pm10', 'temperature', 'humidity')
-    list_filter = ('station', 'timestamp')
-    search_fields = ('station__name',)
+    list_filter = (StationFilter, TimestampRangeFilter, 'timestamp')
+    # Exact match, so the station is looked up once instead of a LIKE over every joined row
+    search_fields = ('=station__name',)
+    # Built for tables with millions of rows: one joined query per page and no COUNT(*) over the table
+    list_select_related = ('station',)
+    ordering = ('-timestamp', '-id')
+    paginator = ReadingPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    autocomplete_fields = ('station',)
 
     def get_station_name(self, obj):
         return obj.station.name if obj.station else ''
     get_station_name.short_description = 'Location'
+    get_station_name.admin_order_field = 'station__name'
+
+    @property
+    def media(self):
+        # select2 and the admin's autocomplete script for StationFilter, plus the glue that applies it
+        widget = AutocompleteSelect(AirQualityReading._meta.get_field('station'), self.admin_site)
+        return super().media + widget.media + forms.Media(js=['airquality/admin/station_filter.js'])
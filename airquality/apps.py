@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AirqualityConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'airquality'
+
+    def ready(self):
+        # Connects the signal receivers that keep the sensor registry current
+        from . import registry  # noqa: F401
@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+
+# US EPA breakpoints: (concentration low, concentration high, index low, index high)
+# PM2.5 uses the 2024 revision; concentrations in µg/m³
+PM25_BREAKPOINTS = [
+    (0.0, 9.0, 0, 50),
+    (9.1, 35.4, 51, 100),
+    (35.5, 55.4, 101, 150),
+    (55.5, 125.4, 151, 200),
+    (125.5, 225.4, 201, 300),
+    (225.5, 325.4, 301, 500),
+]
+
+PM10_BREAKPOINTS = [
+    (0, 54, 0, 50),
+    (55, 154, 51, 100),
+    (155, 254, 101, 150),
+    (255, 354, 151, 200),
+    (355, 424, 201, 300),
+    (425, 604, 301, 500),
+]
+
+# Concentrations are truncated to this many decimals before lookup
+PM25_DECIMALS = 1
+PM10_DECIMALS = 0
+
+MAX_AQI = 500
+
+
+def _sub_index(values, breakpoints, decimals):
+    # Vectorised piecewise-linear interpolation over a breakpoint table; NaN in, NaN out
+    table = np.asarray(breakpoints, dtype=np.float64)
+    c_lo, c_hi, i_lo, i_hi = table.T
+    scale = 10 ** decimals
+    c = np.floor(np.clip(values, 0, None) * scale + 1e-9) / scale
+    idx = np.searchsorted(c_hi, c, side='left')
+    over = idx >= len(table)
+    idx = np.minimum(idx, len(table) - 1)
+    index = (i_hi[idx] - i_lo[idx]) / (c_hi[idx] - c_lo[idx]) * (c - c_lo[idx]) + i_lo[idx]
+    index = np.where(over, MAX_AQI, index)
+    return np.where(np.isnan(values), np.nan, index)
+
+
+def compute_aqi_array(pm25, pm10):
+    """
+    AQI for arrays of PM2.5 and PM10 concentrations: the larger of the two
+    sub-indices, rounded to the nearest integer. NaN where both are NaN.
+    """
+    pm25 = np.asarray(pm25, dtype=np.float64)
+    pm10 = np.asarray(pm10, dtype=np.float64)
+    aqi = np.fmax(_sub_index(pm25, PM25_BREAKPOINTS, PM25_DECIMALS), _sub_index(pm10, PM10_BREAKPOINTS, PM10_DECIMALS))
+    return np.round(aqi)
+
+
+def _scalar_sub_index(value, breakpoints, decimals):
+    if value is None:
+        return None
+    scale = 10 ** decimals
+    c = math.floor(max(value, 0) * scale + 1e-9) / scale
+    for c_lo, c_hi, i_lo, i_hi in breakpoints:
+        if c <= c_hi:
+            return (i_hi - i_lo) / (c_hi - c_lo) * (c - c_lo) + i_lo
+    return MAX_AQI
+
+
+def compute_aqi(pm25=None, pm10=None):
+    # Scalar version for the per-item ingestion path; None when neither concentration is known
+    indices = [
+        index for index in (
+            _scalar_sub_index(pm25, PM25_BREAKPOINTS, PM25_DECIMALS),
+            _scalar_sub_index(pm10, PM10_BREAKPOINTS, PM10_DECIMALS),
+        ) if index is not None
+    ]
+    if not indices:
+        return None
+    return float(round(max(indices)))
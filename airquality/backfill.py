@@ -0,0 +1,195 @@
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import logging
+import queue
+import threading
+
+from django.conf import settings
+
+from .fetch import SensorsAfricaClient, as_items
+from .ingestion import get_station, ingest_items, readings_changed
+from .merge import ONE_MICROSECOND
+from .models import AirStation, BackfillShard
+
+logger = logging.getLogger(__name__)
+
+ONE_DAY = datetime.timedelta(days=1)
+
+# End of one shard's pages on the writer queue: it was stored in full, or the run stopped before it finished
+_DONE = object()
+_STOPPED = object()
+
+
+def plan_shards(sensor_ids, start, end):
+    # (sensor_id, shard start, shard end) per sensor and UTC day of [start, end), in time order
+    shards = []
+    day = datetime.datetime.combine(start.astimezone(datetime.timezone.utc).date(), datetime.time.min,
+                                    tzinfo=datetime.timezone.utc)
+    while day < end:
+        lower, upper = max(day, start), min(day + ONE_DAY, end)
+        shards.extend((sid, lower, upper) for sid in sensor_ids)
+        day += ONE_DAY
+    return shards
+
+
+class Backfill:
+    """
+    Fetch and store the upstream history of sensors over [start, end),
+    picking up where an earlier run over the same window stopped.
+
+    The window is split into one shard per sensor and UTC day, each
+    checkpointed as a BackfillShard row. Shards are fetched on a pool of
+    `workers` threads; their pages go through a bounded queue to a single
+    writer (the calling thread), as in IngestDaemon, so the sensors of a
+    station still merge into one row per moment. A shard is marked done
+    only once all of its pages are stored. Station summaries, rollups and
+    windows are refreshed once per station at the end.
+
+    A sensor's shards start no earlier than its station's `pruned_before`:
+    retention has archived what came before, and ingestion would skip it.
+    """
+
+    def __init__(self, sensor_metadata, start, end, workers=None, queue_size=None, client=None):
+        self.sensor_metadata = sensor_metadata
+        self.start = start
+        self.end = end
+        self.workers = workers or getattr(settings, 'BACKFILL_WORKERS', 4)
+        self.queue_size = queue_size or getattr(settings, 'INGEST_QUEUE_SIZE', 8)
+        # Own client so its connection pool matches the worker count
+        self.client = client or SensorsAfricaClient(max_workers=self.workers)
+        self.stop_event = threading.Event()
+        self.stations = {}
+
+    def stop(self):
+        self.stop_event.set()
+
+    def get_station(self, sid):
+        if sid not in self.stations:
+            self.stations[sid] = get_station(self.sensor_metadata[sid])
+        return self.stations[sid]
+
+    def pruned_starts(self):
+        # {sensor_id: pruned_before} for the sensors whose station was pruned after the window starts
+        station_ids = {meta['station_id'] for meta in self.sensor_metadata.values()}
+        pruned = dict(AirStation.objects.filter(id__in=station_ids, pruned_before__gt=self.start)
+                      .values_list('id', 'pruned_before'))
+        return {
+            sid: pruned[meta['station_id']]
+            for sid, meta in self.sensor_metadata.items() if meta['station_id'] in pruned
+        }
+
+    def load_shards(self, restart=False):
+        """
+        The window's shards, created on the first run. Done shards stay done
+        across runs unless `restart` sets every shard back to pending.
+        """
+        pruned = self.pruned_starts()
+        planned = sorted(
+            (shard for sid in self.sensor_metadata
+             for shard in plan_shards([sid], max(self.start, pruned.get(sid, self.start)), self.end)),
+            key=lambda shard: shard[1],
+        )
+        BackfillShard.objects.bulk_create(
+            [BackfillShard(sensor_id=sid, start=lower, end=upper) for sid, lower, upper in planned],
+            ignore_conflicts=True,
+        )
+        existing = BackfillShard.objects.filter(
+            sensor_id__in=list(self.sensor_metadata), start__gte=self.start, end__lte=self.end,
+        )
+        if restart:
+            existing.update(status=BackfillShard.PENDING, inserted=0, merged=0, skipped=0, error='')
+        # Shards of earlier runs over other windows may sit inside this one; only this window's plan counts
+        by_key = {(shard.sensor_id, shard.start, shard.end): shard for shard in existing}
+        return [by_key[key] for key in planned]
+
+    def fetch_shard(self, shard, pages):
+        outcome = _STOPPED
+        try:
+            url = 'measurements/'
+            params = {
+                'sensor_id': shard.sensor_id,
+                'timestamp__gte': shard.start.isoformat(),
+                # Upstream bounds are inclusive
+                'timestamp__lte': (shard.end - ONE_MICROSECOND).isoformat(),
+            }
+            while url:
+                if self.stop_event.is_set():
+                    return
+                data = self.client.get_json(url, params)
+                if data is None:
+                    # Unlike iter_measurement_pages(), a page that fails to load fails the shard
+                    outcome = 'Upstream request failed.'
+                    return
+                items = as_items(data)
+                if items:
+                    pages.put((shard, items))
+                url, params = (data.get('next') if isinstance(data, dict) else None), None
+            outcome = _DONE
+        except Exception as exc:
+            logger.exception(f"Backfill of sensor {shard.sensor_id} from {shard.start} failed")
+            outcome = str(exc) or exc.__class__.__name__
+        finally:
+            pages.put((shard, outcome))
+
+    def store_page(self, shard, items):
+        result = ingest_items(self.get_station(shard.sensor_id), items, refresh=False)
+        # Saved per page, so rows stored before a crash are still refreshed by the run that resumes
+        shard.inserted += result.inserted
+        shard.merged += result.merged
+        shard.skipped += result.skipped
+        shard.save(update_fields=['inserted', 'merged', 'skipped', 'updated_at'])
+
+    def run(self, restart=False, on_shard=None):
+        """
+        Fetch and store every shard not done yet, calling on_shard(shard)
+        as each one finishes. Returns the window's shards.
+        """
+        shards = self.load_shards(restart)
+        todo = [shard for shard in shards if shard.status != BackfillShard.DONE]
+        pages = queue.Queue(maxsize=self.queue_size)
+        failures = {}
+        pending = len(todo)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for shard in todo:
+                pool.submit(self.fetch_shard, shard, pages)
+            try:
+                while pending:
+                    shard, items = pages.get()
+                    if isinstance(items, list):
+                        if shard.pk not in failures:
+                            try:
+                                self.store_page(shard, items)
+                            except Exception as exc:
+                                logger.exception(f"Storing backfill of sensor {shard.sensor_id} from {shard.start} failed")
+                                failures[shard.pk] = str(exc) or exc.__class__.__name__
+                        continue
+                    pending -= 1
+                    if items is _STOPPED:
+                        continue
+                    error = failures.get(shard.pk) or ('' if items is _DONE else items)
+                    shard.status = BackfillShard.FAILED if error else BackfillShard.DONE
+                    shard.error = error
+                    shard.save()
+                    if on_shard:
+                        on_shard(shard)
+            except BaseException:
+                # Let the fetchers finish, unblocking any waiting on the full queue, so the pool can shut down
+                self.stop()
+                while pending:
+                    if not isinstance(pages.get()[1], list):
+                        pending -= 1
+                raise
+        if todo:
+            self.refresh(shards)
+        return shards
+
+    def refresh(self, shards):
+        # Once per station, over the shards that stored anything, in this run or one it resumes
+        ranges = {}
+        for shard in shards:
+            if shard.inserted or shard.merged:
+                station = self.get_station(shard.sensor_id)
+                _, low, high, inserted = ranges.get(station.pk, (station, shard.start, shard.end, 0))
+                ranges[station.pk] = (station, min(low, shard.start), max(high, shard.end), inserted + shard.inserted)
+        for station, start, end, inserted in ranges.values():
+            readings_changed(station, start, end, inserted)
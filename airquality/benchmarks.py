@@ -0,0 +1,273 @@
+import datetime
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+import numpy as np
+
+from . import fetch
+from .aqi import compute_aqi_array
+from .daemon import IngestDaemon
+from .ingestion import ingest_items
+from .models import AirStation, AirQualityReading, SensorWatermark
+from .stubs import STUB_EPOCH, SensorsAfricaStub, stub_measurement
+
+# Named dataset sizes (total readings across all stations)
+SIZES = {
+    '10k': 10_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+
+BENCH_STATION_PREFIX = 'bench-station-'
+READING_INTERVAL = datetime.timedelta(minutes=1)
+GENERATE_BATCH_SIZE = 5000
+API_PREFIX = '/api/airquality/'
+PERCENTILES = [50, 90, 95, 99]
+
+
+def generate_readings(rows, stations, seed=0, batch_size=GENERATE_BATCH_SIZE):
+    """
+    Create `stations` synthetic stations holding `rows` readings between
+    them, one per minute ending now, with realistic-looking noisy values.
+    Returns the stations. Station summaries are refreshed once at the end.
+    """
+    rng = np.random.default_rng(seed)
+    per_station = max(1, rows // stations)
+    end = timezone.now().replace(second=0, microsecond=0)
+    created = []
+    for n in range(stations):
+        station = AirStation.objects.create(
+            name=f'{BENCH_STATION_PREFIX}{n:03d}',
+            location=f'{-1.3 - n * 0.001:.4f},{36.8 + n * 0.001:.4f}',
+        )
+        count = per_station + (1 if n < rows % stations else 0)
+        start = end - (count - 1) * READING_INTERVAL
+        for offset in range(0, count, batch_size):
+            size = min(batch_size, count - offset)
+            # Daily cycle plus noise; PM2.5 drives most of the AQI spread
+            minutes = np.arange(offset, offset + size)
+            cycle = np.sin(minutes * 2 * np.pi / 1440)
+            pm25 = np.clip(20 + 15 * cycle + rng.gamma(2.0, 6.0, size), 0, None).round(1)
+            pm10 = (pm25 * rng.uniform(1.2, 2.0, size)).round(1)
+            pm1 = (pm25 * rng.uniform(0.5, 0.8, size)).round(1)
+            temperature = (22 + 5 * cycle + rng.normal(0, 0.5, size)).round(1)
+            humidity = np.clip(60 - 15 * cycle + rng.normal(0, 2, size), 0, 100).round(1)
+            aqi = compute_aqi_array(pm25, pm10)
+            AirQualityReading.objects.bulk_create([
+                AirQualityReading(
+                    station=station,
+                    timestamp=start + (offset + i) * READING_INTERVAL,
+                    aqi=float(aqi[i]),
+                    pm1=float(pm1[i]),
+                    pm25=float(pm25[i]),
+                    pm10=float(pm10[i]),
+                    temperature=float(temperature[i]),
+                    humidity=float(humidity[i]),
+                )
+                for i in range(size)
+            ], batch_size=batch_size)
+        station.refresh_summary()
+        created.append(station)
+    return created
+
+
+def benchmark_stations():
+    return list(AirStation.objects.filter(name__startswith=BENCH_STATION_PREFIX).order_by('name'))
+
+
+def latency_summary(timings):
+    # Seconds in, milliseconds out
+    ms = np.asarray(timings) * 1000
+    summary = {f'p{p}_ms': round(float(np.percentile(ms, p)), 3) for p in PERCENTILES}
+    summary.update({
+        'min_ms': round(float(ms.min()), 3),
+        'max_ms': round(float(ms.max()), 3),
+        'mean_ms': round(float(ms.mean()), 3),
+    })
+    return summary
+
+
+def _consume(response):
+    # Streaming responses are only finished once their body has been read
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def measure(fn, iterations, cold=True):
+    """
+    Call fn() `iterations` times and summarise latency. fn returns the
+    number of bytes produced. Query count and peak Python memory come from
+    one extra instrumented call, so tracing doesn't distort the timings.
+    `cold` clears the cache before each call.
+    """
+    timings = []
+    size = 0
+    for _ in range(iterations):
+        if cold:
+            cache.clear()
+        start = time.perf_counter()
+        size = fn()
+        timings.append(time.perf_counter() - start)
+    if cold:
+        cache.clear()
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'iterations': iterations,
+        **latency_summary(timings),
+        'queries': len(queries.captured_queries),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'response_bytes': size,
+    }
+
+
+def endpoint_scenarios(stations):
+    station = stations[len(stations) // 2]
+    # A one-day window near the end of the station's history
+    day = (station.last_timestamp - datetime.timedelta(days=1)).date().isoformat()
+    return {
+        'stations_list': 'stations/',
+        'readings_list': 'readings/?page_size=100',
+        'readings_list_large_page': 'readings/?page_size=1000',
+        'readings_filter': f'readings/?station={station.name}&start={day}&end={day}&aqi_gte=50',
+        'readings_search': f'readings/?search={station.name}&page_size=100',
+        'station_readings': f'stations/{station.id}/readings/?page_size=500',
+        'station_readings_by_name': f'stations/name/{station.name}/readings/?page_size=500',
+        'station_readings_range': f'stations/{station.id}/readings/?start={day}&end={day}&page_size=1000',
+        'station_downsampled': f'stations/{station.id}/readings/?points=500&algo=lttb',
+        'export_csv': f'readings/export/?station={station.id}&format=csv',
+        'export_ndjson': f'readings/export/?station={station.id}&format=ndjson',
+        'export_columnar': f'readings/export/?station={station.id}&format=columnar',
+    }
+
+
+def benchmark_endpoints(stations, iterations):
+    client = Client(HTTP_ACCEPT='application/json')
+    results = {}
+    for name, path in endpoint_scenarios(stations).items():
+        url = API_PREFIX + path
+
+        def request(url=url):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f'GET {url} returned {response.status_code}')
+            return _consume(response)
+        results[name] = {'url': url, **measure(request, iterations)}
+    # The same list request answered from the response cache
+    url = API_PREFIX + 'readings/?page_size=100'
+    results['readings_list_cached'] = {'url': url, **measure(lambda: _consume(client.get(url)), iterations, cold=False)}
+    return results
+
+
+def benchmark_proxy(sensor_metadata, iterations, latency):
+    """
+    proxy/now/ against a local Sensors.Africa stub: `cold` forces a
+    synchronous upstream refresh on every call, `warm` serves the snapshot.
+    """
+    client = Client(HTTP_ACCEPT='application/json')
+    url = API_PREFIX + 'proxy/now/'
+    results = {}
+    with SensorsAfricaStub(sensor_metadata, latency=latency) as stub:
+        conf = {**getattr(settings, 'SENSORS_AFRICA', {}), 'BASE_URL': stub.base_url}
+        with override_settings(SENSORS_AFRICA=conf):
+            # The process-wide client was built from the real settings
+            fetch._client = None
+            try:
+                for name, cold in (('proxy_now_cold', True), ('proxy_now_warm', False)):
+                    results[name] = {
+                        'url': url,
+                        'upstream_latency_ms': latency * 1000,
+                        **measure(lambda: _consume(client.get(url)), iterations, cold=cold),
+                    }
+            finally:
+                fetch._client = None
+    return results
+
+
+def benchmark_ingestion(items, sensor_metadata):
+    """
+    Ingestion throughput: ingest_items() on fresh and on already-stored
+    items, and one full IngestDaemon cycle that pages everything from the
+    stub. Rates are upstream items per second.
+    """
+    results = {}
+    # Start from empty stations and watermarks so a kept database measures the same work
+    # (the sensors' stations are emptied rather than deleted, which would take their Sensor rows with them)
+    AirStation.objects.filter(name='bench-ingest').delete()
+    AirQualityReading.objects.filter(station_id__in={meta['station_id'] for meta in sensor_metadata.values()}).delete()
+    SensorWatermark.objects.filter(sensor_id__in=sensor_metadata).delete()
+    station = AirStation.objects.create(name='bench-ingest', location='0,0')
+    batch = [stub_measurement('PMS/DHT', i, STUB_EPOCH + i * READING_INTERVAL) for i in range(items)]
+    for name in ('ingest_items_new', 'ingest_items_duplicate'):
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            result = ingest_items(station, batch)
+            elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = {
+            'items': items,
+            'inserted': result.inserted,
+            'skipped': result.skipped,
+            'seconds': round(elapsed, 3),
+            'items_per_second': round(items / elapsed, 1),
+            'queries': len(queries.captured_queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    per_sensor = max(1, items // len(sensor_metadata))
+    with SensorsAfricaStub(sensor_metadata, measurements=per_sensor, interval=READING_INTERVAL, page_size=500) as stub:
+        client = fetch.SensorsAfricaClient(base_url=stub.base_url)
+        daemon = IngestDaemon(sensor_metadata, client=client)
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            stats = daemon.run_cycle()
+            elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        client.close()
+        fetched = per_sensor * len(sensor_metadata)
+        results['ingest_daemon_cycle'] = {
+            'items': fetched,
+            'inserted': sum(inserted for inserted, _ in stats.values()),
+            'skipped': sum(skipped for _, skipped in stats.values()),
+            'upstream_requests': stub.requests,
+            'seconds': round(elapsed, 3),
+            'items_per_second': round(fetched / elapsed, 1),
+            'queries': len(queries.captured_queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'run_at': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'numpy': np.__version__,
+        'database': connection.vendor,
+        'machine': platform.machine(),
+    }
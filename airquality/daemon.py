@@ -0,0 +1,158 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import queue
+import random
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Max
+from django.utils import timezone
+
+from .fetch import get_client
+from .ingestion import get_station, ingest_items, parse_timestamp
+from .models import AirQualityReading, SensorWatermark
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of one sensor's pages on the writer queue
+_DONE = object()
+
+
+class IngestDaemon:
+    """
+    Poll Sensors.Africa on a schedule and ingest only what is new.
+
+    Each cycle fetches every sensor from its stored watermark, following
+    upstream pagination, on a small thread pool. Pages go through a bounded
+    queue to a single writer (the calling thread), so slow database writes
+    block the fetchers instead of piling pages up in memory. A sensor's
+    watermark only advances once all of its pages for the cycle are stored.
+
+    `sensor_metadata` is a dict, or a callable returning one (such as
+    registry.sensor_metadata) that is called again at the start of every
+    cycle, so added, moved or deactivated sensors are picked up without a
+    restart.
+    """
+
+    def __init__(self, sensor_metadata, interval=None, jitter=None, queue_size=None, client=None):
+        self.load_sensor_metadata = sensor_metadata if callable(sensor_metadata) else lambda: sensor_metadata
+        self.sensor_metadata = {}
+        self.interval = interval if interval is not None else getattr(settings, 'INGEST_INTERVAL', 300)
+        # Fraction of the interval added or removed at random so workers don't poll in lockstep
+        self.jitter = jitter if jitter is not None else getattr(settings, 'INGEST_JITTER', 0.1)
+        self.queue_size = queue_size or getattr(settings, 'INGEST_QUEUE_SIZE', 8)
+        self.client = client or get_client()
+        self.stop_event = threading.Event()
+        self.stations = {}
+
+    def stop(self):
+        self.stop_event.set()
+
+    def refresh_sensors(self):
+        self.sensor_metadata = self.load_sensor_metadata()
+        # Drop stations of sensors that went away or moved to another station
+        self.stations = {
+            sid: station for sid, station in self.stations.items()
+            if sid in self.sensor_metadata and station.pk == self.sensor_metadata[sid]['station_id']
+        }
+
+    def get_station(self, sid):
+        # Stations are resolved once per sensor, not per item
+        if sid not in self.stations:
+            self.stations[sid] = get_station(self.sensor_metadata[sid])
+        return self.stations[sid]
+
+    def load_watermarks(self):
+        watermarks = {w.sensor_id: w for w in SensorWatermark.objects.filter(sensor_id__in=self.sensor_metadata)}
+        for sid in self.sensor_metadata:
+            if sid not in watermarks:
+                # First run for this sensor: seed from what is already stored
+                latest = AirQualityReading.objects.filter(station=self.get_station(sid)).aggregate(
+                    latest=Max('timestamp'))['latest']
+                watermarks[sid] = SensorWatermark.objects.create(sensor_id=sid, last_timestamp=latest)
+        return watermarks
+
+    def put_page(self, pages, entry, abort):
+        # Gives up once the cycle is aborted, so fetchers can't stay blocked on a queue nobody drains
+        while not abort.is_set():
+            try:
+                pages.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fetch_sensor(self, sid, since, pages, abort):
+        completed = False
+        try:
+            params = {'timestamp__gte': since.isoformat()} if since else {}
+            for items in self.client.iter_measurement_pages(sid, params):
+                if self.stop_event.is_set() or abort.is_set():
+                    return
+                if items and not self.put_page(pages, (sid, items), abort):
+                    return
+            completed = True
+        except Exception:
+            logger.exception(f"Fetching sensor {sid} failed")
+        finally:
+            self.put_page(pages, (sid, _DONE if completed else None), abort)
+
+    def run_cycle(self):
+        """
+        Fetch and store new measurements for every sensor once.
+        Returns {sensor_id: (inserted, skipped)}.
+        """
+        self.refresh_sensors()
+        watermarks = self.load_watermarks()
+        pages = queue.Queue(maxsize=self.queue_size)
+        # Set when the writer fails, so the fetchers of this cycle stop instead of waiting on the queue
+        abort = threading.Event()
+        stats = {sid: [0, 0] for sid in self.sensor_metadata}
+        newest = {}
+        pending = len(self.sensor_metadata)
+        with ThreadPoolExecutor(max_workers=self.client.max_workers) as pool:
+            for sid in self.sensor_metadata:
+                pool.submit(self.fetch_sensor, sid, watermarks[sid].last_timestamp, pages, abort)
+            try:
+                while pending:
+                    sid, items = pages.get()
+                    if items is _DONE or items is None:
+                        pending -= 1
+                        watermark = watermarks[sid]
+                        watermark.last_polled_at = timezone.now()
+                        if items is _DONE and sid in newest:
+                            watermark.last_timestamp = max(filter(None, [watermark.last_timestamp, newest[sid]]))
+                        watermark.save()
+                        continue
+                    result = ingest_items(self.get_station(sid), items)
+                    stats[sid][0] += result.inserted
+                    stats[sid][1] += result.skipped
+                    timestamps = [ts for ts in (parse_timestamp(item.get('timestamp')) for item in items) if ts]
+                    if timestamps:
+                        newest[sid] = max([newest.get(sid) or timestamps[0]] + timestamps)
+            except BaseException:
+                # Stop the fetchers and drop what they queued, so the pool can shut down; watermarks stay put
+                abort.set()
+                while True:
+                    try:
+                        pages.get_nowait()
+                    except queue.Empty:
+                        break
+                raise
+        return {sid: tuple(counts) for sid, counts in stats.items()}
+
+    def next_delay(self):
+        spread = self.interval * self.jitter
+        return max(0, self.interval + random.uniform(-spread, spread))
+
+    def run_forever(self, on_cycle=None):
+        while not self.stop_event.is_set():
+            close_old_connections()
+            try:
+                stats = self.run_cycle()
+                if on_cycle:
+                    on_cycle(stats)
+            except Exception:
+                logger.exception('Ingestion cycle failed')
+            self.stop_event.wait(self.next_delay())
@@ -0,0 +1,121 @@
+from itertools import islice
+
+import numpy as np
+
+from .merge import EPOCH, METRIC_FIELDS
+
+# Upper bound for ?points=
+MAX_POINTS = 5000
+
+# Rows fetched from the database cursor per round trip
+DOWNSAMPLE_CHUNK_SIZE = 5000
+
+
+def load_series(queryset, metrics, chunk_size=DOWNSAMPLE_CHUNK_SIZE):
+    """
+    Read (timestamp, *metrics) from the queryset in timestamp order into
+    NumPy arrays: epoch milliseconds plus one float64 column per metric,
+    with NaN for nulls. Rows are converted `chunk_size` at a time, so only
+    one chunk is ever held as Python objects.
+    """
+    rows = queryset.order_by('timestamp').values_list('timestamp', *metrics).iterator(chunk_size=chunk_size)
+    width = len(metrics)
+    times = []
+    values = []
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        times.append(np.fromiter(
+            ((row[0] - EPOCH).total_seconds() * 1000.0 for row in chunk), dtype=np.float64, count=len(chunk)))
+        values.append(np.fromiter(
+            (np.nan if value is None else value for row in chunk for value in row[1:]),
+            dtype=np.float64, count=len(chunk) * width,
+        ).reshape(len(chunk), width))
+    if not times:
+        return np.empty(0, dtype=np.float64), np.empty((0, width), dtype=np.float64)
+    return np.concatenate(times), np.concatenate(values)
+
+
+def _bucket_edges(n, buckets):
+    # Start index of each of `buckets` near-equal slices of range(n)
+    return (np.arange(buckets) * n) // buckets
+
+
+def downsample_avg(t, v, points):
+    if len(t) <= points:
+        return t, v
+    edges = _bucket_edges(len(t), points)
+    counts = np.diff(np.append(edges, len(t)))
+    return np.add.reduceat(t, edges) / counts, np.add.reduceat(v, edges) / counts
+
+
+def downsample_minmax(t, v, points):
+    # Keep each bucket's minimum and maximum (in time order), two points per bucket
+    if len(t) <= points:
+        return t, v
+    buckets = max(points // 2, 1)
+    bucket_ids = np.repeat(np.arange(buckets), np.diff(np.append(_bucket_edges(len(t), buckets), len(t))))
+    order = np.lexsort((v, bucket_ids))
+    starts = np.searchsorted(bucket_ids[order], np.arange(buckets), side='left')
+    ends = np.searchsorted(bucket_ids[order], np.arange(buckets), side='right') - 1
+    picks = np.sort(np.unique(np.concatenate([order[starts], order[ends]])))
+    return t[picks], v[picks]
+
+
+def downsample_lttb(t, v, points):
+    """
+    Largest-Triangle-Three-Buckets. Keeps the first and last point and, for
+    each bucket in between, the point forming the largest triangle with the
+    previously kept point and the average of the next bucket.
+    """
+    n = len(t)
+    if n <= points:
+        return t, v
+    if points < 3:
+        # No buckets between the ends: just the first and last point
+        ends = np.array([0, n - 1])[:max(points, 1)]
+        return t[ends], v[ends]
+    edges = np.append(1 + _bucket_edges(n - 2, points - 2), n - 1)
+    # Average of every bucket, used as the third triangle corner
+    sums_t = np.add.reduceat(t[1:n - 1], edges[:-1] - 1)
+    sums_v = np.add.reduceat(v[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_t = np.append(sums_t / counts, t[n - 1])
+    avg_v = np.append(sums_v / counts, v[n - 1])
+
+    picks = np.empty(points, dtype=np.int64)
+    picks[0] = 0
+    picks[-1] = n - 1
+    prev = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (t[prev] - avg_t[i + 1]) * (v[lo:hi] - v[prev])
+            - (t[prev] - t[lo:hi]) * (avg_v[i + 1] - v[prev])
+        )
+        prev = lo + int(np.argmax(area))
+        picks[i + 1] = prev
+    return t[picks], v[picks]
+
+
+ALGORITHMS = {
+    'lttb': downsample_lttb,
+    'minmax': downsample_minmax,
+    'avg': downsample_avg,
+}
+
+
+def downsample(queryset, points, algo='lttb', metrics=METRIC_FIELDS):
+    """
+    Return {metric: [[epoch_ms, value], ...]} with at most `points` points
+    per metric. Nulls are dropped per metric before reducing.
+    """
+    reduce = ALGORITHMS[algo]
+    t, v = load_series(queryset, metrics)
+    series = {}
+    for i, metric in enumerate(metrics):
+        mask = ~np.isnan(v[:, i])
+        mt, mv = reduce(t[mask], v[mask, i], points)
+        series[metric] = [list(point) for point in zip(np.round(mt).astype(np.int64).tolist(), mv.tolist())]
+    return series
@@ -0,0 +1,107 @@
+import array
+import csv
+import json
+import struct
+import sys
+
+from .merge import EPOCH, METRIC_FIELDS, ONE_MICROSECOND
+
+# Columns written by every export format, in order
+EXPORT_COLUMNS = ['id', 'station', 'timestamp', 'aqi', *METRIC_FIELDS]
+
+# Matching lookups for values_list(); the station name is joined in the same query
+EXPORT_FIELDS = ['id', 'station__name', 'timestamp', 'aqi', *METRIC_FIELDS]
+
+# Rows fetched from the database cursor per round trip
+EXPORT_CHUNK_SIZE = 2000
+
+# Magic header for the columnar binary format
+COLUMNAR_MAGIC = b'AQCOL1\n'
+
+
+def iter_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    # Yield lists of row tuples without caching the queryset in memory
+    rows = queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Echo:
+    # File-like object for csv.writer that returns the line instead of storing it
+    def write(self, value):
+        return value
+
+
+def stream_csv(chunks):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for chunk in chunks:
+        yield ''.join(writer.writerow(row) for row in chunk)
+
+
+def stream_ndjson(chunks):
+    for chunk in chunks:
+        lines = []
+        for row in chunk:
+            record = dict(zip(EXPORT_COLUMNS, row))
+            record['timestamp'] = record['timestamp'].isoformat() if record['timestamp'] else None
+            lines.append(json.dumps(record))
+        yield '\n'.join(lines) + '\n'
+
+
+def _pack_array(typecode, values):
+    arr = array.array(typecode, values)
+    if sys.byteorder != 'little':
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def stream_columnar(chunks):
+    """
+    Compact column-oriented binary stream, one block per chunk.
+
+    Layout (little-endian): the magic bytes, then for every block a uint32 row
+    count and uint32 count of new station names (each a uint16 length plus
+    UTF-8 bytes), followed by the columns: id int64, station uint32 index into
+    the accumulated name dictionary, timestamp int64 epoch microseconds, then
+    aqi, pm1, pm25, pm10, temperature and humidity as float64 with NaN for
+    nulls. A block with zero rows marks the end of the stream.
+    """
+    yield COLUMNAR_MAGIC
+    station_index = {}
+    nan = float('nan')
+    for chunk in chunks:
+        new_names = []
+        station_ids = []
+        for row in chunk:
+            name = row[1] or ''
+            if name not in station_index:
+                station_index[name] = len(station_index)
+                new_names.append(name)
+            station_ids.append(station_index[name])
+        parts = [struct.pack('<II', len(chunk), len(new_names))]
+        for name in new_names:
+            encoded = name.encode('utf-8')
+            parts.append(struct.pack('<H', len(encoded)))
+            parts.append(encoded)
+        parts.append(_pack_array('q', [row[0] for row in chunk]))
+        parts.append(_pack_array('I', station_ids))
+        parts.append(_pack_array('q', [(row[2] - EPOCH) // ONE_MICROSECOND for row in chunk]))
+        for col in range(3, len(EXPORT_FIELDS)):
+            parts.append(_pack_array('d', [nan if row[col] is None else row[col] for row in chunk]))
+        yield b''.join(parts)
+    yield struct.pack('<II', 0, 0)
+
+
+# format name -> (stream function, content type, file extension)
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv', 'csv'),
+    'ndjson': (stream_ndjson, 'application/x-ndjson', 'ndjson'),
+    'columnar': (stream_columnar, 'application/octet-stream', 'aqcol'),
+}
@@ -0,0 +1,143 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+from django.conf import settings
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import UPSTREAM_LATENCY
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BASE_URL': 'https://api.sensors.africa/v2',
+    'TOKEN': '',
+    'TIMEOUT': 10,
+    'MAX_WORKERS': 8,
+    'RETRIES': 3,
+    'BACKOFF': 0.5,
+}
+
+
+class SensorsAfricaClient:
+    """
+    Sensors.Africa API client that fetches many sensors at once.
+
+    Requests share one keep-alive connection pool, run on a bounded thread
+    pool, time out per request and retry transient failures with backoff.
+    """
+
+    def __init__(self, base_url=None, token=None, timeout=None, max_workers=None, retries=None, backoff=None):
+        conf = {**DEFAULTS, **getattr(settings, 'SENSORS_AFRICA', {})}
+        self.base_url = (base_url or conf['BASE_URL']).rstrip('/')
+        self.token = conf['TOKEN'] if token is None else token
+        self.timeout = timeout or conf['TIMEOUT']
+        self.max_workers = max_workers or conf['MAX_WORKERS']
+        retries = conf['RETRIES'] if retries is None else retries
+        backoff = conf['BACKOFF'] if backoff is None else backoff
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if self.token:
+            self.session.headers['Authorization'] = f'Token {self.token}'
+
+    def get_json(self, path, params=None):
+        # Return the decoded body, or None if the call failed after retries.
+        # Absolute URLs (e.g. a paginated response's `next`) are used as is.
+        if path.startswith(('http://', 'https://')):
+            url = path
+        else:
+            url = f'{self.base_url}/{path.lstrip("/")}'
+        endpoint = urlparse(url).path.rstrip('/').rsplit('/', 1)[-1]
+        start = time.perf_counter()
+        try:
+            resp = self.session.get(url, params=params, timeout=self.timeout)
+        except requests.RequestException as exc:
+            UPSTREAM_LATENCY.observe((endpoint, 'error'), time.perf_counter() - start)
+            logger.warning(f"Sensors.Africa request failed for {url} {params}: {exc}")
+            return None
+        UPSTREAM_LATENCY.observe((endpoint, str(resp.status_code)), time.perf_counter() - start)
+        logger.info(f"Fetched {url} {params}: {resp.status_code} {resp.text[:500]}")
+        if resp.status_code != 200:
+            return None
+        try:
+            return resp.json()
+        except ValueError:
+            logger.warning(f"Sensors.Africa returned invalid JSON for {url} {params}")
+            return None
+
+    def fetch_many(self, requests_by_key):
+        """
+        Run {key: (path, params)} concurrently and return {key: json or None}.
+        Total latency is roughly that of the slowest single request.
+        """
+        if not requests_by_key:
+            return {}
+        workers = min(self.max_workers, len(requests_by_key))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                key: pool.submit(self.get_json, path, params)
+                for key, (path, params) in requests_by_key.items()
+            }
+            return {key: future.result() for key, future in futures.items()}
+
+    def fetch_now(self, sensor_ids):
+        return self.fetch_many({sid: ('now/', {'sensor_id': sid}) for sid in sensor_ids})
+
+    def fetch_measurements(self, params_by_sensor):
+        return self.fetch_many({
+            sid: ('measurements/', {'sensor_id': sid, **params})
+            for sid, params in params_by_sensor.items()
+        })
+
+    def iter_measurement_pages(self, sensor_id, params=None):
+        """
+        Yield lists of measurements for one sensor, following the `next`
+        link of paginated responses. Stops early if a page fails to load.
+        """
+        data = self.get_json('measurements/', {'sensor_id': sensor_id, **(params or {})})
+        while data is not None:
+            yield as_items(data)
+            next_url = data.get('next') if isinstance(data, dict) else None
+            if not next_url:
+                return
+            data = self.get_json(next_url)
+
+    def close(self):
+        self.session.close()
+
+
+def as_items(data):
+    # Upstream returns a list of measurements, a paginated {"results": [...]} page or a single object
+    if data is None:
+        return []
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        return data['results']
+    return data if isinstance(data, list) else [data]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    # Process-wide client so the connection pool survives across requests
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SensorsAfricaClient()
+    return _client
@@ -0,0 +1,105 @@
+import datetime
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import AirStation
+from .registry import registry
+
+
+def parse_bound(value, param):
+    """
+    Parse a start/end query value into (datetime, is_date_only).
+
+    Accepts a date (YYYY-MM-DD) or a datetime; naive datetimes are taken as
+    being in the current time zone.
+    """
+    try:
+        # Dates first: parse_datetime would also accept a bare date as midnight
+        day = parse_date(value)
+        if day is not None:
+            dt = datetime.datetime.combine(day, datetime.time.min)
+            return timezone.make_aware(dt), True
+        dt = parse_datetime(value)
+    except ValueError:
+        dt = None
+    if dt is None:
+        raise ValidationError({param: f"Invalid date or datetime '{value}'."})
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt, False
+
+
+def time_range(start=None, end=None):
+    """
+    Turn start/end query values into a half-open [lower, upper) range.
+
+    A date-only `end` includes that whole day, matching the old
+    `timestamp__date__lte` behaviour; a datetime `end` is exclusive.
+    """
+    lower = upper = None
+    if start:
+        lower, _ = parse_bound(start, 'start')
+    if end:
+        upper, date_only = parse_bound(end, 'end')
+        if date_only:
+            upper += datetime.timedelta(days=1)
+    return lower, upper
+
+
+def filter_time_range(queryset, start=None, end=None):
+    # Plain comparisons on the column keep the (station, timestamp) index usable
+    lower, upper = time_range(start, end)
+    if lower is not None:
+        queryset = queryset.filter(timestamp__gte=lower)
+    if upper is not None:
+        queryset = queryset.filter(timestamp__lt=upper)
+    return queryset
+
+
+def filter_station(queryset, station):
+    # Allow filter by station id or name; names are resolved to ids in memory, so the filter is on the indexed FK
+    if station:
+        if station.isdigit():
+            queryset = queryset.filter(station__id=station)
+        else:
+            queryset = queryset.filter(station_id__in=registry.station_ids(station))
+    return queryset
+
+
+def stations_matching(station):
+    # The AirStation rows a `station` parameter (id or name) refers to; all when unset
+    stations = AirStation.objects.all()
+    if station:
+        if station.isdigit():
+            stations = stations.filter(id=station)
+        else:
+            stations = stations.filter(id__in=registry.station_ids(station))
+    return stations
+
+
+def filter_aqi(queryset, aqi_gte=None, aqi_lte=None):
+    for value, param, lookup in ((aqi_gte, 'aqi_gte', 'aqi__gte'), (aqi_lte, 'aqi_lte', 'aqi__lte')):
+        if value:
+            try:
+                queryset = queryset.filter(**{lookup: float(value)})
+            except ValueError:
+                raise ValidationError({param: f"Invalid number '{value}'."})
+    return queryset
+
+
+def filter_readings(queryset, params):
+    queryset = filter_station(queryset, params.get('station'))
+    queryset = filter_aqi(queryset, params.get('aqi_gte'), params.get('aqi_lte'))
+    return filter_time_range(queryset, params.get('start'), params.get('end'))
+
+
+class ReadingFilterBackend(BaseFilterBackend):
+    """
+    Filter readings by `station` (id or name), `aqi_gte`/`aqi_lte` and a
+    `start`/`end` time range.
+    """
+    def filter_queryset(self, request, queryset, view):
+        return filter_readings(queryset, request.query_params)
@@ -0,0 +1,253 @@
+from collections import namedtuple
+import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+import numpy as np
+
+from .aqi import compute_aqi, compute_aqi_array
+from .live import publish_readings
+from .merge import EPOCH, METRIC_FIELDS, ONE_MICROSECOND, asof_contains, asof_match, merge_streams, merge_tolerance, to_frame
+from .models import AirStation, AirQualityReading
+from .rollups import refresh_rollups
+from .windows import refresh_window
+
+PM_MAPPING = {
+    'P0': 'pm1',
+    'P1': 'pm10',
+    'P2': 'pm25',
+}
+
+# Rows per bulk INSERT (and per lookup of the readings already stored around them)
+INGEST_BATCH_SIZE = 1000
+
+# merged: rows that completed another sensor's reading instead of becoming a row of their own
+IngestResult = namedtuple('IngestResult', ['inserted', 'skipped', 'merged'], defaults=[0])
+
+
+def map_values(item):
+    # Flatten sensordatavalues into {'pm25': '12.3', 'temperature': '21.0', ...}
+    mapped_values = {}
+    for v in item.get('sensordatavalues', []):
+        key = PM_MAPPING.get(v['value_type'], v['value_type'])
+        mapped_values[key] = v['value']
+    return mapped_values
+
+
+def parse_timestamp(value):
+    if isinstance(value, datetime.datetime):
+        dt = value
+    elif isinstance(value, str):
+        try:
+            dt = parse_datetime(value)
+        except ValueError:
+            dt = None
+        if dt is None:
+            return None
+    else:
+        return None
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt, datetime.timezone.utc)
+    return dt
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalise_item(item):
+    """
+    Turn one Sensors.Africa measurement into a dict of AirQualityReading
+    field values, or None if it has no usable timestamp. Metrics the sensor
+    didn't report are None.
+    """
+    ts = parse_timestamp(item.get('timestamp'))
+    if ts is None:
+        return None
+    mapped_values = map_values(item)
+    row = {'timestamp': ts}
+    for field in METRIC_FIELDS:
+        row[field] = _to_float(mapped_values.get(field))
+    row['aqi'] = compute_aqi(row['pm25'], row['pm10'])
+    return row
+
+
+def get_station(meta):
+    # The station of a registry.sensor_metadata() entry; callers keep it per sensor rather than per item
+    return AirStation.objects.get(pk=meta['station_id'])
+
+
+def readings_changed(station, start, end, inserted=None):
+    """
+    Bring everything derived from a station's readings up to date after
+    writes in [start, end]. When the writes only added `inserted` readings
+    and filled in others, the summary is extended from that range; without
+    `inserted` (deletes, moved readings) it is recounted.
+    """
+    if inserted is None:
+        station.refresh_summary(touch=False)
+    else:
+        station.extend_summary(inserted, start, end)
+    refresh_rollups(station, start, end)
+    refresh_window(station, start, end)
+    # Only now: a response cached under the new marker must already see the new rollups and window
+    station.touch()
+    publish_readings(station, start, end)
+
+
+def _write_params(values):
+    # (aqi, *METRIC_FIELDS) per row of a value matrix, with None for NaN
+    aqi = compute_aqi_array(values[:, 1], values[:, 2])
+    frame = np.column_stack([aqi, values])
+    cells = frame.astype(object)
+    cells[np.isnan(frame)] = None
+    return cells.tolist()
+
+
+def insert_readings(station, ts, values):
+    """
+    INSERT one station's rows from a frame (see to_frame()) with a single
+    executemany, skipping timestamps that already have a reading. Cheaper
+    than bulk_create, whose per-field preparation of model instances costs
+    more than the insert itself. Returns the number of rows inserted.
+    """
+    if not len(ts):
+        return 0
+    adapt = connection.ops.adapt_datetimefield_value
+    params = [
+        (station.pk, adapt(_from_micros(micros)), *row)
+        for micros, row in zip(ts.tolist(), _write_params(values))
+    ]
+    columns = ['station_id', 'timestamp', 'aqi', *METRIC_FIELDS]
+    sql = 'INSERT INTO {} ({}) VALUES ({}) ON CONFLICT DO NOTHING'.format(
+        connection.ops.quote_name(AirQualityReading._meta.db_table),
+        ', '.join(connection.ops.quote_name(column) for column in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+        # Rows dropped by the unique constraint (e.g. a concurrent writer got there first) aren't counted
+        return cursor.rowcount if cursor.rowcount >= 0 else len(params)
+
+
+def update_readings(ids, values):
+    # Overwrite the metrics and AQI of stored readings; bulk_update's CASE per row costs far more than this
+    if not len(ids):
+        return
+    quote = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote(AirQualityReading._meta.db_table),
+        ', '.join(f'{quote(column)} = %s' for column in ['aqi', *METRIC_FIELDS]),
+        quote('id'),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [(*row, reading_id) for reading_id, row in zip(ids.tolist(), _write_params(values))])
+
+
+def ingest_rows(station, rows, batch_size=INGEST_BATCH_SIZE, refresh=True):
+    # Store normalised row dicts for one station (None for rows that failed to normalise); see ingest_frame()
+    rows = list(rows)
+    valid = [row for row in rows if row is not None]
+    result = ingest_frame(station, *to_frame(valid), batch_size=batch_size, refresh=refresh)
+    return result._replace(skipped=result.skipped + len(rows) - len(valid))
+
+
+def ingest_frame(station, ts, values, batch_size=INGEST_BATCH_SIZE, refresh=True):
+    """
+    Store a time-sorted frame of one station's readings (one row per
+    moment, see merge_streams()). A row within the merge tolerance of a
+    stored reading that lacks its metrics fills that reading in (e.g. DHT
+    values completing a PMS row stored by an earlier batch); otherwise it
+    is inserted, unless a reading already exists at exactly that timestamp.
+    Rows a stored reading within the tolerance already holds, rows without
+    any metric and repeats of a timestamp are skipped, so ingesting the
+    same items again changes nothing. So are rows before the station's
+    `pruned_before`: retention has archived that range already.
+
+    Then refreshes the station summary and the rollup buckets touched,
+    unless `refresh` is False and the caller runs readings_changed()
+    itself, e.g. once after several calls. Returns an IngestResult.
+    """
+    tolerance = merge_tolerance()
+    total = len(ts)
+    keep = ~np.isnan(values).all(axis=1)
+    # Read fresh: daemons and the write-behind queue hold their station objects across retention runs
+    pruned_before = AirStation.objects.filter(pk=station.pk).values_list('pruned_before', flat=True).first()
+    if pruned_before is not None:
+        keep &= ts >= (pruned_before - EPOCH) // ONE_MICROSECOND
+    ts, first = np.unique(ts[keep], return_index=True)
+    values = values[keep][first]
+    inserted = 0
+    skipped = total - len(ts)
+    merged = 0
+    changed = []
+
+    def flush(new_ts, new_values):
+        # One range query for the stored readings around the batch, then the UPDATE and INSERT in one transaction
+        stored = list(
+            AirQualityReading.objects.filter(
+                station=station,
+                timestamp__gte=_from_micros(new_ts[0] - tolerance),
+                timestamp__lte=_from_micros(new_ts[-1] + tolerance),
+            ).order_by('timestamp', 'id').values_list('id', 'timestamp', *METRIC_FIELDS)
+        )
+        # Already in time order, so the ids line up with the frame
+        stored_ids = np.array([row[0] for row in stored], dtype=np.int64)
+        stored_ts, stored_values = to_frame([dict(zip(['timestamp', *METRIC_FIELDS], row[1:])) for row in stored])
+        # Already stored, possibly merged into a reading at another timestamp: re-fetches must not add half-rows
+        duplicate = asof_contains(new_ts, new_values, stored_ts, stored_values, tolerance)
+        fresh = np.nonzero(~duplicate)[0]
+        match = np.full(len(new_ts), -1, dtype=np.int64)
+        match[fresh] = asof_match(new_ts[fresh], new_values[fresh], stored_ts, stored_values, tolerance)
+        matched = match >= 0
+        # Not mergeable, and a reading already sits at this exact time
+        duplicate |= ~matched & np.isin(new_ts, stored_ts)
+
+        with transaction.atomic():
+            if matched.any():
+                old = stored_values[match[matched]]
+                update_readings(stored_ids[match[matched]], np.where(np.isnan(old), new_values[matched], old))
+                changed.extend([stored_ts[match[matched]].min(), stored_ts[match[matched]].max()])
+
+            insert = ~matched & ~duplicate
+            added = insert_readings(station, new_ts[insert], new_values[insert])
+            if insert.any():
+                changed.extend([new_ts[insert].min(), new_ts[insert].max()])
+        return added, int(duplicate.sum()) + int(insert.sum()) - added, int(matched.sum())
+
+    for start in range(0, len(ts), batch_size):
+        added, dropped, filled = flush(ts[start:start + batch_size], values[start:start + batch_size])
+        inserted += added
+        skipped += dropped
+        merged += filled
+    if changed and refresh:
+        readings_changed(station, _from_micros(min(changed)), _from_micros(max(changed)), inserted)
+    return IngestResult(inserted, skipped, merged)
+
+
+def _from_micros(micros):
+    return EPOCH + datetime.timedelta(microseconds=int(micros))
+
+
+def ingest_streams(station, streams, batch_size=INGEST_BATCH_SIZE, refresh=True):
+    """
+    Normalise, merge and store raw Sensors.Africa items for one station,
+    given as one list per sensor (e.g. its PMS and its DHT sensor), so each
+    moment becomes one complete reading. See ingest_frame() for `refresh`.
+    """
+    normalised = [[normalise_item(item) for item in items] for items in streams]
+    valid = [[row for row in rows if row is not None] for rows in normalised]
+    invalid = sum(len(rows) for rows in normalised) - sum(len(rows) for rows in valid)
+    ts, values = merge_streams(valid)
+    result = ingest_frame(station, ts, values, batch_size=batch_size, refresh=refresh)
+    merged_in_batch = sum(len(stream) for stream in valid) - len(ts)
+    return IngestResult(result.inserted, result.skipped + invalid, result.merged + merged_in_batch)
+
+
+def ingest_items(station, items, batch_size=INGEST_BATCH_SIZE, refresh=True):
+    # Normalise and store a batch of raw Sensors.Africa items from one sensor
+    return ingest_streams(station, [items], batch_size=batch_size, refresh=refresh)
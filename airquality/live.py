@@ -0,0 +1,227 @@
+import asyncio
+from collections import OrderedDict
+import json
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import AirStation, AirQualityReading
+from .serializers import AirQualityReadingSerializer
+
+logger = logging.getLogger(__name__)
+
+# Rows sent per station when catching up after a reconnect or a poll
+CATCH_UP_LIMIT = 500
+# Readings remembered per station, so later changes to them (e.g. DHT values merged in) go out as updates
+RECENT_LIMIT = 100
+
+
+class Subscription:
+    def __init__(self, station_ids, loop, maxsize):
+        self.station_ids = station_ids
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def wants(self, station_id):
+        return self.station_ids is None or station_id in self.station_ids
+
+    def offer(self, event):
+        # Runs on the subscriber's loop; a client that can't keep up loses its oldest events
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class ReadingBroker:
+    """
+    In-process pub/sub for newly stored readings.
+
+    Publishers may be any thread (ingestion, API writes); each subscriber is
+    an asyncio queue on the event loop of the SSE connection that owns it.
+    Idle subscribers cost one queue each and nothing per reading. Readings
+    are de-duplicated per station by id, so the direct ingestion feed and the
+    database poller can both publish safely. The last RECENT_LIMIT readings
+    of each station are remembered, and sent again as `update` events when
+    they change, e.g. when another sensor's values are merged into them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._last_ids = {}
+        self._recent = {}
+        self._markers = {}
+        self._poller = None
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def subscribe(self, station_ids=None, maxsize=100):
+        loop = asyncio.get_running_loop()
+        sub = Subscription(station_ids, loop, maxsize)
+        with self._lock:
+            self._subscribers.add(sub)
+        self._ensure_poller(loop)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, station_id, readings):
+        # readings: serialised reading dicts for one station, oldest first; rows seen before only go out if they changed
+        with self._lock:
+            last_id = self._last_ids.get(station_id, 0)
+            recent = self._recent.setdefault(station_id, OrderedDict())
+            events = []
+            for reading in readings:
+                if reading['id'] > last_id:
+                    events.append(('reading', reading))
+                    last_id = reading['id']
+                elif reading['id'] in recent and recent[reading['id']] != reading:
+                    events.append(('update', reading))
+                else:
+                    continue
+                recent[reading['id']] = reading
+            if not events:
+                return
+            while len(recent) > RECENT_LIMIT:
+                recent.popitem(last=False)
+            self._last_ids[station_id] = last_id
+            targets = [sub for sub in self._subscribers if sub.wants(station_id)]
+        for sub in targets:
+            for event in events:
+                try:
+                    sub.loop.call_soon_threadsafe(sub.offer, event)
+                except RuntimeError:
+                    # The subscriber's loop has closed
+                    self.unsubscribe(sub)
+                    break
+
+    def _ensure_poller(self, loop):
+        interval = getattr(settings, 'LIVE_POLL_INTERVAL', 5)
+        if interval and (self._poller is None or self._poller.done()):
+            self._poller = loop.create_task(self._poll(interval))
+
+    async def _poll(self, interval):
+        # The poller outlives the request that started it, so it can't use that
+        # request's thread-sensitive executor
+        await sync_to_async(self.prime, thread_sensitive=False)()
+        while self.has_subscribers():
+            await asyncio.sleep(interval)
+            try:
+                await sync_to_async(self.poll_once, thread_sensitive=False)()
+            except Exception:
+                logger.exception('Live readings poll failed')
+
+    def prime(self):
+        # Rows that existed before anyone subscribed are not news
+        newest = AirQualityReading.objects.aggregate(newest=Max('id'))['newest'] or 0
+        markers = _station_markers()
+        with self._lock:
+            for station_id, updated_at in markers.items():
+                self._last_ids.setdefault(station_id, newest)
+                self._markers.setdefault(station_id, updated_at)
+
+    def poll_once(self):
+        """
+        Pick up rows written or changed by other processes (e.g.
+        ingest_daemon) by watching each station's change marker: one small
+        query per interval for the whole process, however many clients are
+        connected, plus two per station that changed.
+        """
+        for station_id, updated_at in _station_markers().items():
+            with self._lock:
+                if self._markers.get(station_id) == updated_at:
+                    continue
+                self._markers[station_id] = updated_at
+                last_id = self._last_ids.get(station_id, 0)
+                recent_ids = list(self._recent.get(station_id, ()))
+            readings = readings_by_id(recent_ids) if recent_ids else []
+            self.publish(station_id, readings + readings_after(station_id, last_id))
+
+
+def _station_markers():
+    return dict(AirStation.objects.values_list('id', 'updated_at'))
+
+
+def readings_after(station_id, last_id, limit=CATCH_UP_LIMIT):
+    # Readings of one station, or of all stations when station_id is None, with ids above last_id
+    rows = AirQualityReading.objects.filter(id__gt=last_id)
+    if station_id is not None:
+        rows = rows.filter(station_id=station_id)
+    return list(AirQualityReadingSerializer(rows.order_by('id')[:limit], many=True).data)
+
+
+def readings_by_id(ids):
+    return list(AirQualityReadingSerializer(AirQualityReading.objects.filter(id__in=ids).order_by('id'), many=True).data)
+
+
+broker = ReadingBroker()
+
+
+def publish_readings(station, start, end):
+    # Called from the ingestion path; costs nothing when nobody is listening
+    if not broker.has_subscribers():
+        return
+    rows = AirQualityReading.objects.filter(
+        station=station, timestamp__gte=start, timestamp__lte=end
+    ).order_by('id')[:CATCH_UP_LIMIT]
+    broker.publish(station.id, AirQualityReadingSerializer(rows, many=True).data)
+
+
+def _format_event(payload, event='reading'):
+    data = f"event: {event}\ndata: {json.dumps(payload, cls=JSONEncoder)}\n\n"
+    # Updates carry no id, so they don't move the client's Last-Event-ID back
+    return data if event == 'update' else f"id: {payload['id']}\n{data}"
+
+
+async def live_readings(request):
+    """
+    Server-Sent Events stream of new readings, optionally limited to
+    ?station=<id>[,<id>...]. Readings changed after they were sent (e.g.
+    completed by another sensor's values) are sent again as `update`
+    events. Reconnecting clients send Last-Event-ID and receive the
+    readings added since. Needs the ASGI application so idle
+    connections don't each hold a worker thread.
+    """
+    station_param = request.GET.get('station')
+    station_ids = None
+    if station_param:
+        try:
+            station_ids = {int(s) for s in station_param.split(',')}
+        except ValueError:
+            return HttpResponseBadRequest('station must be a comma-separated list of ids')
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        last_event_id = 0
+    heartbeat = getattr(settings, 'LIVE_HEARTBEAT', 15)
+    sub = broker.subscribe(station_ids)
+
+    async def events():
+        try:
+            yield 'retry: 5000\n\n'
+            if last_event_id:
+                for station_id in sorted(station_ids) if station_ids else [None]:
+                    for payload in await sync_to_async(readings_after)(station_id, last_event_id):
+                        yield _format_event(payload)
+            while True:
+                try:
+                    event, payload = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield _format_event(payload, event)
+        finally:
+            broker.unsubscribe(sub)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from airquality.models import AirStation, AirQualityReading
+from airquality.retention import prune_station, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Archive and delete raw readings older than the retention period. Rollups are kept.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Days of raw readings to keep (default: RETENTION_RAW_DAYS).')
+        parser.add_argument('--station', action='append', help='Station id or name (repeatable); defaults to all stations.')
+        archive = parser.add_mutually_exclusive_group()
+        archive.add_argument('--archive', dest='archive', action='store_true', default=None,
+                             help='Write removed readings to archive files first (default: RETENTION_ARCHIVE).')
+        archive.add_argument('--no-archive', dest='archive', action='store_false', help='Delete without archiving.')
+        parser.add_argument('--batch-size', type=int, help='Rows per DELETE (default: RETENTION_BATCH_SIZE).')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches to let other writers in.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many readings would be removed.')
+
+    def handle(self, *args, **options):
+        cutoff = retention_cutoff(options['days'])
+        if cutoff is None:
+            raise CommandError('Retention is disabled (RETENTION_RAW_DAYS=0); pass --days to run it anyway.')
+        archive = getattr(settings, 'RETENTION_ARCHIVE', True) if options['archive'] is None else options['archive']
+        stations = AirStation.objects.all()
+        if options['station']:
+            ids = [s for s in options['station'] if s.isdigit()]
+            names = [s for s in options['station'] if not s.isdigit()]
+            stations = stations.filter(id__in=ids) | stations.filter(name__in=names)
+
+        self.stdout.write(f'Removing raw readings before {cutoff.isoformat()}')
+        total = 0
+        for station in stations:
+            if options['dry_run']:
+                count = AirQualityReading.objects.filter(station=station, timestamp__lt=cutoff).count()
+                self.stdout.write(f'{station.name}: {count} readings would be removed')
+                total += count
+                continue
+            archived, deleted = prune_station(station, cutoff, archive, options['batch_size'], options['pause'])
+            self.stdout.write(f'{station.name}: {archived} archived, {deleted} deleted')
+            total += deleted
+        self.stdout.write(self.style.SUCCESS(f'Done: {total} readings {"to remove" if options["dry_run"] else "removed"}.'))
@@ -0,0 +1,96 @@
+import datetime
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from airquality.backfill import Backfill
+from airquality.models import BackfillShard
+from airquality.registry import registry
+
+
+def parse_bound(value):
+    # A date (midnight UTC) or an ISO 8601 datetime; naive times are UTC
+    try:
+        dt = parse_datetime(value)
+        if dt is None:
+            day = parse_date(value)
+            dt = datetime.datetime.combine(day, datetime.time.min) if day else None
+    except ValueError:
+        dt = None
+    if dt is None:
+        raise CommandError(f'Invalid date or datetime {value!r}.')
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt, datetime.timezone.utc)
+    return dt
+
+
+class Command(BaseCommand):
+    help = (
+        'Backfill Sensors.Africa history over [--from, --to) in per-sensor, per-day shards fetched in parallel. '
+        'Finished shards are checkpointed, so re-running the same window resumes where it stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', required=True, help='Start of the window (date or ISO datetime, UTC if naive).')
+        parser.add_argument('--to', dest='end', help='End of the window, exclusive (default: now).')
+        parser.add_argument('--sensor', type=int, action='append', help='Sensor id (repeatable); defaults to all sensors.')
+        parser.add_argument('--workers', type=int, help='Shards fetched at once (default: settings.BACKFILL_WORKERS).')
+        parser.add_argument('--queue-size', type=int, help='Pages buffered between fetchers and the writer.')
+        parser.add_argument('--restart', action='store_true', help='Fetch every shard again, including finished ones.')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        start = parse_bound(options['start'])
+        end = parse_bound(options['end']) if options['end'] else timezone.now()
+        if start >= end:
+            raise CommandError('--from must be before --to.')
+        sensor_metadata = registry.sensor_metadata()
+        if options['sensor']:
+            unknown = set(options['sensor']) - set(sensor_metadata)
+            if unknown:
+                raise CommandError(f"Unknown or inactive sensor {', '.join(map(str, sorted(unknown)))}.")
+            sensor_metadata = {sid: sensor_metadata[sid] for sid in options['sensor']}
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError('--workers must be at least 1.')
+
+        backfill = Backfill(sensor_metadata, start, end, workers=options['workers'], queue_size=options['queue_size'])
+        for sid, pruned_before in sorted(backfill.pruned_starts().items()):
+            self.stdout.write(self.style.WARNING(
+                f'Sensor {sid}: readings before {pruned_before.isoformat()} were archived by retention; '
+                f'backfilling from there.'
+            ))
+
+        def shutdown(signum, frame):
+            self.stdout.write('Stopping; unfinished shards resume on the next run...')
+            backfill.stop()
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        self.stdout.write(f'Backfilling {len(sensor_metadata)} sensors from {start.isoformat()} to {end.isoformat()} '
+                          f'with {backfill.workers} workers...')
+        try:
+            shards = backfill.run(restart=options['restart'], on_shard=self.report_shard)
+        finally:
+            backfill.client.close()
+
+        done = [shard for shard in shards if shard.status == BackfillShard.DONE]
+        failed = [shard for shard in shards if shard.status == BackfillShard.FAILED]
+        summary = (
+            f'{len(done)} of {len(shards)} shards done, {len(failed)} failed; '
+            f'{sum(s.inserted for s in shards)} inserted, {sum(s.merged for s in shards)} merged, '
+            f'{sum(s.skipped for s in shards)} skipped.'
+        )
+        if len(done) == len(shards):
+            self.stdout.write(self.style.SUCCESS(f'Backfill complete: {summary}'))
+        else:
+            self.stdout.write(self.style.WARNING(f'Backfill incomplete: {summary} Run it again to resume.'))
+
+    def report_shard(self, shard):
+        if self.verbosity < 2:
+            return
+        line = f'Sensor {shard.sensor_id} {shard.start.isoformat()}: '
+        if shard.status == BackfillShard.FAILED:
+            self.stderr.write(line + f'failed: {shard.error}')
+        else:
+            self.stdout.write(line + f'{shard.inserted} inserted, {shard.merged} merged, {shard.skipped} skipped')
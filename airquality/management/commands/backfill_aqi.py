@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+import numpy as np
+from airquality.aqi import compute_aqi_array
+from airquality.models import AirQualityReading
+
+
+class Command(BaseCommand):
+    help = 'Compute AQI for stored readings in chunks, walking the table by id.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows read and updated per batch.')
+        parser.add_argument('--all', action='store_true', help='Recompute every row, not only rows with no AQI.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        queryset = AirQualityReading.objects.order_by('id')
+        if not options['all']:
+            queryset = queryset.filter(aqi__isnull=True)
+        last_id = 0
+        updated = 0
+        while True:
+            rows = list(
+                queryset.filter(id__gt=last_id).values_list('id', 'pm1', 'pm25', 'pm10')[:chunk_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            ids, pm1, pm25, pm10 = (np.asarray(col, dtype=np.float64) for col in zip(*rows))
+            # Older ingestion stored 0 for every PM value a DHT-only sensor didn't report
+            no_pm = (pm1 == 0) & (pm25 == 0) & (pm10 == 0)
+            aqi = np.where(no_pm, np.nan, compute_aqi_array(pm25, pm10))
+            readings = [
+                AirQualityReading(id=int(pk), aqi=None if np.isnan(value) else float(value))
+                for pk, value in zip(ids, aqi)
+            ]
+            AirQualityReading.objects.bulk_update(readings, ['aqi'], batch_size=chunk_size)
+            updated += len(readings)
+            self.stdout.write(f'Updated {updated} readings (up to id {last_id})')
+        self.stdout.write(self.style.SUCCESS(f'AQI backfill complete: {updated} readings updated.'))
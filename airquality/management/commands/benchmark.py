@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from airquality.benchmarks import (
+    SIZES, benchmark_endpoints, benchmark_ingestion, benchmark_proxy, benchmark_stations, environment,
+    generate_readings,
+)
+from airquality.models import AirQualityReading
+from airquality.registry import registry
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the read endpoints, the now proxy (against a local Sensors.Africa stub) and ingestion '
+        'on a synthetic dataset in a separate test database, and write the results as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=list(SIZES), default='10k', help='Total synthetic readings.')
+        parser.add_argument('--stations', type=int, default=20, help='Stations the readings are spread over.')
+        parser.add_argument('--iterations', type=int, default=20, help='Requests per endpoint.')
+        parser.add_argument('--ingest-items', type=int, default=10000, help='Upstream items per ingestion run.')
+        parser.add_argument('--upstream-latency', type=float, default=0.05,
+                            help='Seconds the stub waits before each response.')
+        parser.add_argument('--output', help='Results file; defaults to benchmark-<size>.json.')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the benchmark database, and its dataset, for the next run.')
+        parser.add_argument('--skip', action='append', choices=['endpoints', 'proxy', 'ingest'], default=[],
+                            help='Leave out a group of benchmarks (repeatable).')
+
+    def handle(self, *args, **options):
+        rows = SIZES[options['size']]
+        if options['stations'] < 1:
+            raise CommandError('--stations must be at least 1.')
+        output = options['output'] or f"benchmark-{options['size']}.json"
+
+        # SQLite test databases default to in-memory, which would skew both timings and memory
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            test_settings['NAME'] = os.path.join(tempfile.gettempdir(), f"airquality-benchmark-{options['size']}.sqlite3")
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            report = self.run(rows, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {output}'))
+
+    def run(self, rows, options):
+        report = {'environment': environment(), 'dataset': {}, 'results': {}}
+        stations = benchmark_stations()
+        stored = AirQualityReading.objects.filter(station__in=stations).count()
+        if len(stations) != options['stations'] or stored != rows:
+            AirQualityReading.objects.all().delete()
+            for station in stations:
+                station.delete()
+            self.stdout.write(f"Generating {rows:,} readings over {options['stations']} stations...")
+            start = time.perf_counter()
+            stations = generate_readings(rows, options['stations'])
+            report['dataset']['generate_seconds'] = round(time.perf_counter() - start, 1)
+        report['dataset'].update({'size': options['size'], 'readings': rows, 'stations': len(stations)})
+        # The registry may still hold the real database's sensors
+        registry.invalidate()
+        sensor_metadata = registry.sensor_metadata()
+
+        if 'endpoints' not in options['skip']:
+            self.stdout.write('Timing read endpoints...')
+            report['results'].update(benchmark_endpoints(stations, options['iterations']))
+        if 'proxy' not in options['skip']:
+            self.stdout.write('Timing proxy/now/ against the stub...')
+            report['results'].update(benchmark_proxy(sensor_metadata, options['iterations'], options['upstream_latency']))
+        if 'ingest' not in options['skip']:
+            self.stdout.write('Timing ingestion...')
+            report['results'].update(benchmark_ingestion(options['ingest_items'], sensor_metadata))
+
+        for name, result in report['results'].items():
+            if 'p50_ms' in result:
+                self.stdout.write(
+                    f"{name:28} p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+                    f"{result['queries']:3d} queries  {result['peak_memory_kb']:10.1f} KB"
+                )
+            else:
+                self.stdout.write(
+                    f"{name:28} {result['items_per_second']:11,.0f} items/s  "
+                    f"{result['queries']:3d} queries  {result['peak_memory_kb']:10.1f} KB"
+                )
+        return report
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from airquality.models import AirQualityReading
+from airquality.renderers import FastJSONRenderer, orjson
+from airquality.serializers import AirQualityReadingFastSerializer, AirQualityReadingSerializer, FAST_READING_VALUES
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+class Command(BaseCommand):
+    help = 'Compare the ModelSerializer and fast-path reading serializers on stored readings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Number of most recent readings to serialise.')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per variant; the best time is reported.')
+
+    def handle(self, *args, **options):
+        qs = AirQualityReading.objects.order_by('-timestamp', '-id')[:options['rows']]
+        count = qs.count()
+        if not count:
+            raise CommandError('No readings stored; ingest or generate some first.')
+
+        def model_path():
+            return JSONRenderer().render(AirQualityReadingSerializer(list(qs), many=True).data)
+
+        def fast_path():
+            return FastJSONRenderer().render(AirQualityReadingFastSerializer(list(qs.values(*FAST_READING_VALUES)), many=True).data)
+
+        if model_path() != fast_path():
+            raise CommandError('Fast-path output differs from AirQualityReadingSerializer.')
+
+        repeat = options['repeat']
+        model_time = best_of(repeat, model_path)
+        fast_time = best_of(repeat, fast_path)
+        self.stdout.write(f"{count} rows, renderer: {'orjson' if orjson else 'json'}")
+        self.stdout.write(f'ModelSerializer + JSONRenderer: {model_time * 1000:.1f} ms ({count / model_time:,.0f} rows/s)')
+        self.stdout.write(f'Fast path + FastJSONRenderer:   {fast_time * 1000:.1f} ms ({count / fast_time:,.0f} rows/s)')
+        self.stdout.write(self.style.SUCCESS(f'Speedup: {model_time / fast_time:.1f}x'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from airquality.models import AirStation
+from airquality.rollups import rebuild_rollups
+from airquality.windows import refresh_window
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly and daily rollup tables, and the rolling windows, from raw readings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--station', action='append', help='Station id or name (repeatable); defaults to all stations.')
+
+    def handle(self, *args, **options):
+        stations = AirStation.objects.all()
+        if options['station']:
+            ids = [s for s in options['station'] if s.isdigit()]
+            names = [s for s in options['station'] if not s.isdigit()]
+            stations = stations.filter(id__in=ids) | stations.filter(name__in=names)
+        for station in stations:
+            # Window first: rebuild_rollups bumps the station's change marker when it's done
+            refresh_window(station)
+            rebuild_rollups(station)
+            self.stdout.write(f'Rebuilt rollups for {station.name}')
+        self.stdout.write(self.style.SUCCESS('Rollups rebuilt.'))
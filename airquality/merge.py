@@ -0,0 +1,138 @@
+import datetime
+
+from django.conf import settings
+import numpy as np
+
+from .aqi import compute_aqi_array
+
+# Reading metrics, in column order of a frame's value matrix
+METRIC_FIELDS = ['pm1', 'pm25', 'pm10', 'temperature', 'humidity']
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+
+# Bit per metric, for telling which metrics a row carries
+_METRIC_BITS = 1 << np.arange(len(METRIC_FIELDS), dtype=np.int64)
+
+
+def merge_tolerance():
+    # Largest gap, in microseconds, between two sensors' rows that still describe the same moment
+    return int(getattr(settings, 'MERGE_TOLERANCE_SECONDS', 60) * 1_000_000)
+
+
+def to_frame(rows):
+    """
+    Turn row dicts (an aware `timestamp` plus metric values, None when not
+    reported) into a frame: epoch-microsecond timestamps and a float64
+    value matrix with NaN for missing metrics, sorted by time.
+    """
+    ts = np.fromiter(((row['timestamp'] - EPOCH) // ONE_MICROSECOND for row in rows), dtype=np.int64, count=len(rows))
+    values = np.array(
+        [[np.nan if row.get(field) is None else row[field] for field in METRIC_FIELDS] for row in rows],
+        dtype=np.float64,
+    ).reshape(len(rows), len(METRIC_FIELDS))
+    order = np.argsort(ts, kind='stable')
+    return ts[order], values[order]
+
+
+def metric_bits(values):
+    return (~np.isnan(values)).astype(np.int64) @ _METRIC_BITS
+
+
+def asof_match(left_ts, left_values, right_ts, right_values, tolerance):
+    """
+    As-of join of two time-sorted frames. For every left row return the
+    index of the nearest right row within `tolerance` that carries none of
+    the same metrics, or -1. Only the neighbours either side of the left
+    timestamp are considered, and each right row is matched at most once,
+    to its closest left row. Rows of the same sensor never match each
+    other, since they report the same metrics.
+    """
+    match = np.full(len(left_ts), -1, dtype=np.int64)
+    if not len(left_ts) or not len(right_ts):
+        return match
+    left_bits = metric_bits(left_values)
+    right_bits = metric_bits(right_values)
+    distance = np.full(len(left_ts), np.iinfo(np.int64).max, dtype=np.int64)
+    after = np.searchsorted(right_ts, left_ts)
+    for candidate in (after - 1, after):
+        valid = (candidate >= 0) & (candidate < len(right_ts))
+        candidate = np.clip(candidate, 0, len(right_ts) - 1)
+        gap = np.abs(right_ts[candidate] - left_ts)
+        better = valid & (gap <= tolerance) & ((left_bits & right_bits[candidate]) == 0) & (gap < distance)
+        match = np.where(better, candidate, match)
+        distance = np.where(better, gap, distance)
+    # Right rows claimed more than once go to the closest left row
+    claimed = np.nonzero(match >= 0)[0]
+    if len(claimed):
+        ranked = claimed[np.lexsort((distance[claimed], match[claimed]))]
+        repeat = np.zeros(len(ranked), dtype=bool)
+        repeat[1:] = match[ranked][1:] == match[ranked][:-1]
+        match[ranked[repeat]] = -1
+    return match
+
+
+def asof_contains(left_ts, left_values, right_ts, right_values, tolerance):
+    """
+    For every left row, whether a right row within `tolerance` already
+    carries all of its metrics with the same values, e.g. an item that was
+    merged into a stored reading at another timestamp and is fetched again.
+    """
+    found = np.zeros(len(left_ts), dtype=bool)
+    if not len(left_ts) or not len(right_ts):
+        return found
+    lower = np.searchsorted(right_ts, left_ts - tolerance, side='left')
+    upper = np.searchsorted(right_ts, left_ts + tolerance, side='right')
+    reported = ~np.isnan(left_values)
+    # Every right row in each left row's window, one offset at a time
+    for offset in range(int((upper - lower).max())):
+        candidate = lower + offset
+        valid = candidate < upper
+        values = right_values[np.minimum(candidate, len(right_ts) - 1)]
+        found |= valid & ((values == left_values) | ~reported).all(axis=1)
+    return found
+
+
+def merge_frames(left, right, tolerance):
+    # Fill each left row's missing metrics from its as-of match; unmatched right rows are kept as they are
+    left_ts, left_values = left
+    right_ts, right_values = right
+    match = asof_match(left_ts, left_values, right_ts, right_values, tolerance)
+    matched = match >= 0
+    values = left_values.copy()
+    values[matched] = np.where(np.isnan(left_values[matched]), right_values[match[matched]], left_values[matched])
+    unmatched = np.ones(len(right_ts), dtype=bool)
+    unmatched[match[matched]] = False
+    ts = np.concatenate([left_ts, right_ts[unmatched]])
+    values = np.vstack([values, right_values[unmatched]])
+    order = np.argsort(ts, kind='stable')
+    return ts[order], values[order]
+
+
+def merge_streams(streams, tolerance=None):
+    """
+    Merge the rows of co-located sensors (e.g. a station's PMS and DHT
+    streams, one list of row dicts each) into one frame with a row per
+    moment. Returns (timestamps, values); see to_frame().
+    """
+    tolerance = merge_tolerance() if tolerance is None else tolerance
+    frames = [to_frame(rows) for rows in streams if rows]
+    if not frames:
+        return to_frame([])
+    merged = frames[0]
+    for frame in frames[1:]:
+        merged = merge_frames(merged, frame, tolerance)
+    return merged
+
+
+def from_frame(ts, values):
+    # Back to row dicts with None for missing metrics, and the AQI of the combined PM values
+    aqi = compute_aqi_array(values[:, 1], values[:, 2]).tolist()
+    rows = []
+    for micros, row_values, row_aqi in zip(ts.tolist(), values.tolist(), aqi):
+        row = {'timestamp': EPOCH + datetime.timedelta(microseconds=micros)}
+        for field, value in zip(METRIC_FIELDS, row_values):
+            row[field] = None if value != value else value
+        row['aqi'] = None if row_aqi != row_aqi else row_aqi
+        rows.append(row)
+    return rows
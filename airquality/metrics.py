@@ -0,0 +1,178 @@
+from bisect import bisect_left
+import contextvars
+import hmac
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+# Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+ROW_BUCKETS = (0, 1, 10, 100, 500, 1000, 5000, 10000)
+BYTE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Observations cost one bisect and a lock; the
+    cumulative bucket counts Prometheus expects are built at render time.
+    """
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then sum
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = ('le', bound if bound == '+Inf' else repr(float(bound)))
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, [le])} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+REQUESTS = Counter('airquality_http_requests_total', 'HTTP requests by view, method and status.',
+                   ('view', 'method', 'status'))
+REQUEST_LATENCY = Histogram('airquality_http_request_duration_seconds', 'Time to produce the response.',
+                            ('view', 'method'))
+DB_QUERIES = Histogram('airquality_db_queries_per_request', 'Database queries issued per request.',
+                       ('view',), QUERY_COUNT_BUCKETS)
+DB_TIME = Histogram('airquality_db_time_seconds', 'Time spent in database queries per request.', ('view',))
+RESPONSE_ROWS = Histogram('airquality_response_rows', 'Rows serialised per API response.', ('view',), ROW_BUCKETS)
+RESPONSE_BYTES = Histogram('airquality_response_bytes', 'Response body size; streamed bodies once fully sent.',
+                           ('view',), BYTE_BUCKETS)
+UPSTREAM_LATENCY = Histogram('airquality_upstream_request_duration_seconds',
+                             'Sensors.Africa API calls, including retries.', ('endpoint', 'status'))
+
+METRICS = [REQUESTS, REQUEST_LATENCY, DB_QUERIES, DB_TIME, RESPONSE_ROWS, RESPONSE_BYTES, UPSTREAM_LATENCY]
+
+
+class RequestStats:
+    def __init__(self, keep_sql=False):
+        self.queries = 0
+        self.db_time = 0.0
+        # (sql, seconds) pairs, only kept for the slow-request log
+        self.sql = [] if keep_sql else None
+
+
+# Stats of the request being handled; copied into sync_to_async threads with the context
+current_request = contextvars.ContextVar('airquality_request_stats', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.queries += 1
+        stats.db_time += elapsed
+        if stats.sql is not None:
+            stats.sql.append((sql, elapsed))
+
+
+def _install_query_recorder(sender, connection, **kwargs):
+    # Connection wrappers are per thread and reused across reconnects, so install once each
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def install_query_recorders():
+    # For connections this thread opened before the signal handler was registered
+    for connection in connections.all(initialized_only=True):
+        _install_query_recorder(None, connection)
+
+
+connection_created.connect(_install_query_recorder)
+
+
+def metrics_enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def scrape_allowed(request):
+    # A matching bearer token, when METRICS_TOKEN is set, or a client address in METRICS_ALLOWED_IPS
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        header = request.headers.get('Authorization', '')
+        if header.startswith('Bearer ') and hmac.compare_digest(header[7:].encode(), token.encode()):
+            return True
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+
+
+def metrics_view(request):
+    # Per-process figures: with several workers, scrape each one or aggregate upstream
+    if not metrics_enabled():
+        raise Http404
+    if not scrape_allowed(request):
+        raise PermissionDenied
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
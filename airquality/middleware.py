@@ -0,0 +1,131 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import (
+    DB_QUERIES, DB_TIME, REQUESTS, REQUEST_LATENCY, RESPONSE_BYTES, RESPONSE_ROWS, RequestStats, current_request,
+    install_query_recorders, metrics_enabled,
+)
+
+logger = logging.getLogger('airquality.slow_requests')
+
+
+def view_label(request):
+    # Route names keep label cardinality bounded; unnamed routes use the view's import path
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match._func_path
+
+
+def response_rows(response):
+    data = getattr(response, 'data', None)
+    if isinstance(data, list):
+        return len(data)
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        return len(data['results'])
+    return None
+
+
+def _count_bytes(content, done):
+    size = 0
+    try:
+        for chunk in content:
+            size += len(chunk)
+            yield chunk
+    finally:
+        done(size)
+
+
+async def _acount_bytes(content, done):
+    size = 0
+    try:
+        async for chunk in content:
+            size += len(chunk)
+            yield chunk
+    finally:
+        done(size)
+
+
+class MetricsMiddleware:
+    """
+    Record latency, database queries and time, serialised rows and
+    response size per resolved view, for the /metrics endpoint.
+
+    With METRICS_SLOW_REQUEST_MS set, requests slower than that are logged
+    together with their SQL. Works on both the WSGI and ASGI stacks.
+    Queries a streamed body runs while it is being sent are not counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = metrics_enabled()
+        self.slow_ms = getattr(settings, 'METRICS_SLOW_REQUEST_MS', 0)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        install_query_recorders()
+        stats = RequestStats(keep_sql=bool(self.slow_ms))
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.record(request, response, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        stats = RequestStats(keep_sql=bool(self.slow_ms))
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.record(request, response, stats, time.perf_counter() - start)
+
+    def record(self, request, response, stats, elapsed):
+        view = view_label(request)
+        REQUESTS.inc((view, request.method, str(response.status_code)))
+        REQUEST_LATENCY.observe((view, request.method), elapsed)
+        DB_QUERIES.observe((view,), stats.queries)
+        DB_TIME.observe((view,), stats.db_time)
+        rows = response_rows(response)
+        if rows is not None:
+            RESPONSE_ROWS.observe((view,), rows)
+        if response.has_header('Content-Length'):
+            # Includes file responses, which are left unwrapped so they can still use sendfile
+            RESPONSE_BYTES.observe((view,), int(response['Content-Length']))
+        elif response.streaming:
+            # Exports and live streams: size is known once the body has been sent
+            def done(size):
+                RESPONSE_BYTES.observe((view,), size)
+            if response.is_async:
+                response.streaming_content = _acount_bytes(response.streaming_content, done)
+            else:
+                response.streaming_content = _count_bytes(response.streaming_content, done)
+        else:
+            RESPONSE_BYTES.observe((view,), len(response.content))
+        if self.slow_ms and elapsed * 1000 >= self.slow_ms:
+            self.log_slow_request(request, view, response, stats, elapsed)
+        return response
+
+    def log_slow_request(self, request, view, response, stats, elapsed):
+        lines = [
+            f'Slow request: {request.method} {request.get_full_path()} ({view}) -> {response.status_code} '
+            f'in {elapsed * 1000:.1f} ms, {stats.queries} queries in {stats.db_time * 1000:.1f} ms'
+        ]
+        for sql, seconds in stats.sql:
+            lines.append(f'  [{seconds * 1000:.1f} ms] {sql}')
+        logger.warning('\n'.join(lines))
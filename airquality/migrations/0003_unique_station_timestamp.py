@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:53
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_readings(apps, schema_editor):
+    # Keep the oldest row for every (station, timestamp) pair so the constraint can be added
+    AirQualityReading = apps.get_model('airquality', 'AirQualityReading')
+    duplicates = (
+        AirQualityReading.objects.values('station', 'timestamp')
+        .annotate(keep_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for dup in duplicates.iterator():
+        AirQualityReading.objects.filter(
+            station=dup['station'], timestamp=dup['timestamp']
+        ).exclude(id=dup['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airquality', '0002_alter_airqualityreading_aqi'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='airqualityreading',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(remove_duplicate_readings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='airqualityreading',
+            constraint=models.UniqueConstraint(fields=('station', 'timestamp'), name='unique_station_timestamp'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airquality', '0003_unique_station_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='airqualityreading',
+            index=models.Index(fields=['timestamp', 'id'], name='reading_timestamp_id_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def backfill_station_summaries(apps, schema_editor):
+    AirStation = apps.get_model('airquality', 'AirStation')
+    for station in AirStation.objects.all():
+        stats = station.readings.aggregate(count=Count('id'), first=Min('timestamp'), last=Max('timestamp'))
+        station.reading_count = stats['count']
+        station.first_timestamp = stats['first']
+        station.last_timestamp = stats['last']
+        station.latest_reading = station.readings.order_by('-timestamp', '-id').first()
+        station.save(update_fields=['reading_count', 'first_timestamp', 'last_timestamp', 'latest_reading'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airquality', '0004_reading_timestamp_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airstation',
+            name='first_timestamp',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='airstation',
+            name='last_timestamp',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='airstation',
+            name='latest_reading',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='airquality.airqualityreading'),
+        ),
+        migrations.AddField(
+            model_name='airstation',
+            name='reading_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_station_summaries, migrations.RunPython.noop),
+    ]
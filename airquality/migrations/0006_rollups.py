@@ -0,0 +1,82 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airquality', '0005_airstation_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('pm1_min', models.FloatField(blank=True, null=True)),
+                ('pm1_max', models.FloatField(blank=True, null=True)),
+                ('pm1_mean', models.FloatField(blank=True, null=True)),
+                ('pm1_p95', models.FloatField(blank=True, null=True)),
+                ('pm25_min', models.FloatField(blank=True, null=True)),
+                ('pm25_max', models.FloatField(blank=True, null=True)),
+                ('pm25_mean', models.FloatField(blank=True, null=True)),
+                ('pm25_p95', models.FloatField(blank=True, null=True)),
+                ('pm10_min', models.FloatField(blank=True, null=True)),
+                ('pm10_max', models.FloatField(blank=True, null=True)),
+                ('pm10_mean', models.FloatField(blank=True, null=True)),
+                ('pm10_p95', models.FloatField(blank=True, null=True)),
+                ('temperature_min', models.FloatField(blank=True, null=True)),
+                ('temperature_max', models.FloatField(blank=True, null=True)),
+                ('temperature_mean', models.FloatField(blank=True, null=True)),
+                ('temperature_p95', models.FloatField(blank=True, null=True)),
+                ('humidity_min', models.FloatField(blank=True, null=True)),
+                ('humidity_max', models.FloatField(blank=True, null=True)),
+                ('humidity_mean', models.FloatField(blank=True, null=True)),
+                ('humidity_p95', models.FloatField(blank=True, null=True)),
+                ('station', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='airquality.airstation')),
+            ],
+            options={
+                'ordering': ['bucket_start'],
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('station', 'bucket_start'), name='unique_daily_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('pm1_min', models.FloatField(blank=True, null=True)),
+                ('pm1_max', models.FloatField(blank=True, null=True)),
+                ('pm1_mean', models.FloatField(blank=True, null=True)),
+                ('pm1_p95', models.FloatField(blank=True, null=True)),
+                ('pm25_min', models.FloatField(blank=True, null=True)),
+                ('pm25_max', models.FloatField(blank=True, null=True)),
+                ('pm25_mean', models.FloatField(blank=True, null=True)),
+                ('pm25_p95', models.FloatField(blank=True, null=True)),
+                ('pm10_min', models.FloatField(blank=True, null=True)),
+                ('pm10_max', models.FloatField(blank=True, null=True)),
+                ('pm10_mean', models.FloatField(blank=True, null=True)),
+                ('pm10_p95', models.FloatField(blank=True, null=True)),
+                ('temperature_min', models.FloatField(blank=True, null=True)),
+                ('temperature_max', models.FloatField(blank=True, null=True)),
+                ('temperature_mean', models.FloatField(blank=True, null=True)),
+                ('temperature_p95', models.FloatField(blank=True, null=True)),
+                ('humidity_min', models.FloatField(blank=True, null=True)),
+                ('humidity_max', models.FloatField(blank=True, null=True)),
+                ('humidity_mean', models.FloatField(blank=True, null=True)),
+                ('humidity_p95', models.FloatField(blank=True, null=True)),
+                ('station', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='airquality.airstation')),
+            ],
+            options={
+                'ordering': ['bucket_start'],
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('station', 'bucket_start'), name='unique_hourly_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airquality', '0006_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='airqualityreading',
+            name='aqi',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airquality', '0007_airqualityreading_aqi_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sensor_id', models.PositiveIntegerField(unique=True)),
+                ('last_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('last_polled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airquality', '0008_sensorwatermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airstation',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
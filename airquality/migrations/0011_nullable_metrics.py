@@ -0,0 +1,77 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:17
+
+import datetime
+
+from django.db import migrations, models
+from django.db.models import Q
+from django.db.models.functions import TruncDay
+
+from airquality.merge import METRIC_FIELDS
+from airquality.rollups import build_rollups
+
+
+def clear_zero_fill(apps, schema_editor):
+    # Rows stored before merging had zeros for the metrics their sensor doesn't measure
+    AirQualityReading = apps.get_model('airquality', 'AirQualityReading')
+    AirStation = apps.get_model('airquality', 'AirStation')
+    rollup_models = {'hour': apps.get_model('airquality', 'HourlyRollup'), 'day': apps.get_model('airquality', 'DailyRollup')}
+    dht_only = AirQualityReading.objects.filter(pm1=0, pm25=0, pm10=0).filter(~Q(temperature=0) | ~Q(humidity=0))
+    pms_only = AirQualityReading.objects.filter(temperature=0, humidity=0).filter(~Q(pm1=0) | ~Q(pm25=0) | ~Q(pm10=0))
+    # The UTC days whose rollups averaged those zeros in
+    affected = set()
+    for rows in (dht_only, pms_only):
+        days = rows.annotate(day=TruncDay('timestamp', tzinfo=datetime.timezone.utc)).values_list('station_id', 'day')
+        affected.update(days.distinct().order_by())
+    dht_only.update(pm1=None, pm25=None, pm10=None, aqi=None)
+    pms_only.update(temperature=None, humidity=None)
+
+    stations = AirStation.objects.in_bulk({station_id for station_id, _ in affected})
+    for station_id, day in sorted(affected):
+        station = stations[station_id]
+        upper = day + datetime.timedelta(days=1)
+        if station.pruned_before is not None and day < station.pruned_before:
+            # Raw readings already removed by retention: nothing to rebuild from
+            continue
+        rows = list(
+            AirQualityReading.objects.filter(station_id=station_id, timestamp__gte=day, timestamp__lt=upper)
+            .values_list('timestamp', *METRIC_FIELDS)
+        )
+        for bucket, model in rollup_models.items():
+            model.objects.filter(station_id=station_id, bucket_start__gte=day, bucket_start__lt=upper).delete()
+            model.objects.bulk_create(build_rollups(model, station, bucket, rows))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airquality', '0010_retention'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='airqualityreading',
+            name='humidity',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='airqualityreading',
+            name='pm1',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='airqualityreading',
+            name='pm10',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='airqualityreading',
+            name='pm25',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='airqualityreading',
+            name='temperature',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(clear_zero_fill, migrations.RunPython.noop),
+    ]
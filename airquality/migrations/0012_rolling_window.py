@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airquality', '0011_nullable_metrics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollingWindow',
+            fields=[
+                ('station', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='window', serialize=False, to='airquality.airstation')),
+                ('as_of', models.DateTimeField(blank=True, null=True)),
+                ('buckets', models.JSONField(default=list)),
+                ('pm25_1h', models.FloatField(blank=True, null=True)),
+                ('pm25_8h', models.FloatField(blank=True, null=True)),
+                ('pm25_24h', models.FloatField(blank=True, null=True)),
+                ('pm10_1h', models.FloatField(blank=True, null=True)),
+                ('pm10_8h', models.FloatField(blank=True, null=True)),
+                ('pm10_24h', models.FloatField(blank=True, null=True)),
+                ('nowcast_pm25', models.FloatField(blank=True, null=True)),
+                ('nowcast_pm10', models.FloatField(blank=True, null=True)),
+                ('nowcast_aqi', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.text import slugify
+
+# The sensors hard-coded in views.py and ingest_external_data.py before the registry
+SENSORS = [
+    (4898, 'Auditorium Parking', -1.309, 36.812, 'PMS', 'esp8266-14114907'),
+    (4899, 'Auditorium Parking', -1.309, 36.812, 'DHT', 'esp8266-14114907'),
+    (4900, 'Langata Gate', -1.310, 36.813, 'PMS', 'esp8266-14160853'),
+    (4901, 'Langata Gate', -1.310, 36.813, 'DHT', 'esp8266-14160853'),
+    (4896, 'Central Building', -1.311, 36.814, 'PMS/DHT', 'esp8266-14169100'),
+]
+
+
+def fill_slugs(apps, schema_editor):
+    AirStation = apps.get_model('airquality', 'AirStation')
+    stations = list(AirStation.objects.only('id', 'name'))
+    for station in stations:
+        station.slug = slugify(station.name, allow_unicode=True)
+    AirStation.objects.bulk_update(stations, ['slug'], batch_size=500)
+
+
+def seed_sensors(apps, schema_editor):
+    AirStation = apps.get_model('airquality', 'AirStation')
+    Sensor = apps.get_model('airquality', 'Sensor')
+    for sensor_id, name, lat, lon, sensor_type, label in SENSORS:
+        # The station ingestion would have created for the sensor, as get_station() did
+        station = AirStation.objects.filter(name=name).order_by('id').first()
+        if station is None:
+            station = AirStation.objects.create(
+                name=name, slug=slugify(name, allow_unicode=True), location=f'{lat},{lon}',
+            )
+        Sensor.objects.get_or_create(
+            id=sensor_id,
+            defaults={'station': station, 'type': sensor_type, 'label': label, 'lat': lat, 'lon': lon},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('airquality', '0013_backfill_shard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airstation',
+            name='slug',
+            field=models.SlugField(allow_unicode=True, default='', editable=False, max_length=100),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_slugs, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='Sensor',
+            fields=[
+                ('id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('type', models.CharField(choices=[('PMS', 'PMS'), ('DHT', 'DHT'), ('PMS/DHT', 'PMS/DHT')], max_length=10)),
+                ('label', models.CharField(blank=True, max_length=100)),
+                ('lat', models.FloatField(blank=True, null=True)),
+                ('lon', models.FloatField(blank=True, null=True)),
+                ('active', models.BooleanField(default=True)),
+                ('station', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sensors', to='airquality.airstation')),
+            ],
+        ),
+        migrations.RunPython(seed_sensors, migrations.RunPython.noop),
+    ]
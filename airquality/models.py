@@ -1,18 +1,223 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Max, Min
+from django.utils import timezone
+from django.utils.text import slugify
 
 # Create your models here.
 
+def station_slug(name):
+    # Normalised station name for lookups: case, spacing and punctuation don't matter
+    return slugify(name, allow_unicode=True)
+
 class AirStation(models.Model):
     name = models.CharField(max_length=100)
+    # station_slug(name), kept in step by save(); name lookups go through it instead of name__iexact
+    slug = models.SlugField(max_length=100, allow_unicode=True, editable=False)
     location = models.CharField(max_length=100, blank=True)
     # Add more fields if needed
+    # Precomputed summary, kept current after every write path by extend_summary() or refresh_summary()
+    reading_count = models.PositiveIntegerField(default=0)
+    first_timestamp = models.DateTimeField(null=True, blank=True)
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+    latest_reading = models.ForeignKey(
+        'AirQualityReading', null=True, blank=True, on_delete=models.SET_NULL, related_name='+'
+    )
+    # Bumped whenever the station or any of its readings change; drives ETag/Last-Modified
+    updated_at = models.DateTimeField(auto_now=True)
+    # Raw readings before this were removed by apply_retention; rollups before it are final
+    pruned_before = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        self.slug = station_slug(self.name)
+        if kwargs.get('update_fields') is not None and 'name' in kwargs['update_fields']:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'slug'}
+        super().save(*args, **kwargs)
+
+    def touch(self):
+        # Bump the change marker, once everything derived from the readings is current
+        self.save(update_fields=['updated_at'])
+
+    def extend_summary(self, inserted, start, end):
+        """
+        Update the summary after writes that added `inserted` readings and
+        filled in others, all within [start, end], without going over the
+        rest of the station's history. Deletes and moved readings need
+        refresh_summary().
+        """
+        written = self.readings.filter(timestamp__gte=start, timestamp__lte=end)
+        first = written.order_by('timestamp').values_list('timestamp', flat=True).first()
+        newest = written.order_by('-timestamp', '-id').first()
+        with transaction.atomic():
+            # Read fresh and locked: concurrent writers to the station each add their own rows
+            stored = AirStation.objects.select_for_update().filter(pk=self.pk).values(
+                'first_timestamp', 'last_timestamp').get()
+            updates = {'reading_count': F('reading_count') + inserted}
+            if first is not None and (stored['first_timestamp'] is None or first < stored['first_timestamp']):
+                updates['first_timestamp'] = first
+            if newest is not None and (stored['last_timestamp'] is None or newest.timestamp >= stored['last_timestamp']):
+                updates['last_timestamp'] = newest.timestamp
+                updates['latest_reading'] = newest
+            AirStation.objects.filter(pk=self.pk).update(**updates)
+        self.refresh_from_db(fields=['reading_count', 'first_timestamp', 'last_timestamp', 'latest_reading'])
+
+    def refresh_summary(self, touch=True):
+        # Count/min/max and the latest row all come off the (station, timestamp) index
+        stats = self.readings.aggregate(
+            count=Count('id'), first=Min('timestamp'), last=Max('timestamp')
+        )
+        self.reading_count = stats['count']
+        self.first_timestamp = stats['first']
+        self.last_timestamp = stats['last']
+        self.latest_reading = self.readings.order_by('-timestamp', '-id').first()
+        fields = ['reading_count', 'first_timestamp', 'last_timestamp', 'latest_reading']
+        self.save(update_fields=fields + ['updated_at'] if touch else fields)
 
 class AirQualityReading(models.Model):
     station = models.ForeignKey(AirStation, on_delete=models.CASCADE, related_name='readings')
-    timestamp = models.DateTimeField(auto_now_add=True)
-    aqi = models.FloatField(null=True, blank=True)
-    pm1 = models.FloatField()
-    pm25 = models.FloatField()
-    pm10 = models.FloatField()
-    temperature = models.FloatField()
-    humidity = models.FloatField()
+    timestamp = models.DateTimeField(default=timezone.now)
+    aqi = models.FloatField(null=True, blank=True, db_index=True)
+    # Null when no sensor at the station reported the metric for this moment
+    pm1 = models.FloatField(null=True, blank=True)
+    pm25 = models.FloatField(null=True, blank=True)
+    pm10 = models.FloatField(null=True, blank=True)
+    temperature = models.FloatField(null=True, blank=True)
+    humidity = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Also serves as the (station_id, timestamp) index for per-station range scans
+            models.UniqueConstraint(fields=['station', 'timestamp'], name='unique_station_timestamp'),
+        ]
+        indexes = [
+            # Cross-station range filters and (timestamp, id) keyset pagination
+            models.Index(fields=['timestamp', 'id'], name='reading_timestamp_id_idx'),
+        ]
+
+
+class RollupBase(models.Model):
+    # Aggregates of one station's readings over one UTC bucket (hour or day)
+    station = models.ForeignKey(AirStation, on_delete=models.CASCADE)
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    pm1_min = models.FloatField(null=True, blank=True)
+    pm1_max = models.FloatField(null=True, blank=True)
+    pm1_mean = models.FloatField(null=True, blank=True)
+    pm1_p95 = models.FloatField(null=True, blank=True)
+    pm25_min = models.FloatField(null=True, blank=True)
+    pm25_max = models.FloatField(null=True, blank=True)
+    pm25_mean = models.FloatField(null=True, blank=True)
+    pm25_p95 = models.FloatField(null=True, blank=True)
+    pm10_min = models.FloatField(null=True, blank=True)
+    pm10_max = models.FloatField(null=True, blank=True)
+    pm10_mean = models.FloatField(null=True, blank=True)
+    pm10_p95 = models.FloatField(null=True, blank=True)
+    temperature_min = models.FloatField(null=True, blank=True)
+    temperature_max = models.FloatField(null=True, blank=True)
+    temperature_mean = models.FloatField(null=True, blank=True)
+    temperature_p95 = models.FloatField(null=True, blank=True)
+    humidity_min = models.FloatField(null=True, blank=True)
+    humidity_max = models.FloatField(null=True, blank=True)
+    humidity_mean = models.FloatField(null=True, blank=True)
+    humidity_p95 = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+        ordering = ['bucket_start']
+
+
+class HourlyRollup(RollupBase):
+    class Meta(RollupBase.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=['station', 'bucket_start'], name='unique_hourly_rollup'),
+        ]
+
+
+class DailyRollup(RollupBase):
+    class Meta(RollupBase.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=['station', 'bucket_start'], name='unique_daily_rollup'),
+        ]
+
+
+class RollingWindow(models.Model):
+    # Trailing PM averages of one station, kept current on every write path by windows.refresh_window()
+    station = models.OneToOneField(AirStation, on_delete=models.CASCADE, primary_key=True, related_name='window')
+    # UTC hour of the station's newest reading; every window ends with this hour
+    as_of = models.DateTimeField(null=True, blank=True)
+    # Ring of the newest 24 hours: [hour start (epoch seconds), pm25 sum, pm25 count, pm10 sum, pm10 count]
+    buckets = models.JSONField(default=list)
+    pm25_1h = models.FloatField(null=True, blank=True)
+    pm25_8h = models.FloatField(null=True, blank=True)
+    pm25_24h = models.FloatField(null=True, blank=True)
+    pm10_1h = models.FloatField(null=True, blank=True)
+    pm10_8h = models.FloatField(null=True, blank=True)
+    pm10_24h = models.FloatField(null=True, blank=True)
+    nowcast_pm25 = models.FloatField(null=True, blank=True)
+    nowcast_pm10 = models.FloatField(null=True, blank=True)
+    nowcast_aqi = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class Sensor(models.Model):
+    # A Sensors.Africa sensor feeding a station; readings of a station's sensors merge into one row
+    TYPE_CHOICES = [('PMS', 'PMS'), ('DHT', 'DHT'), ('PMS/DHT', 'PMS/DHT')]
+
+    # Upstream's sensor_id
+    id = models.PositiveIntegerField(primary_key=True)
+    station = models.ForeignKey(AirStation, on_delete=models.CASCADE, related_name='sensors')
+    type = models.CharField(max_length=10, choices=TYPE_CHOICES)
+    # Upstream node name, e.g. esp8266-14114907
+    label = models.CharField(max_length=100, blank=True)
+    lat = models.FloatField(null=True, blank=True)
+    lon = models.FloatField(null=True, blank=True)
+    # Inactive sensors are left out of ingestion and proxy/now/
+    active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f'{self.id} ({self.type})'
+
+
+class SensorWatermark(models.Model):
+    # Newest upstream timestamp ingested per Sensors.Africa sensor, kept by ingest_daemon
+    sensor_id = models.PositiveIntegerField(unique=True)
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+    last_polled_at = models.DateTimeField(null=True, blank=True)
+
+
+class BackfillShard(models.Model):
+    # One sensor's upstream history over [start, end), at most a UTC day; the backfill command's checkpoint
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    sensor_id = models.PositiveIntegerField()
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    inserted = models.PositiveIntegerField(default=0)
+    merged = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sensor_id', 'start', 'end'], name='unique_backfill_shard'),
+        ]
+
+
+class ReadingArchive(models.Model):
+    # One gzipped NDJSON file of raw readings removed by apply_retention, for one station and UTC day
+    station = models.ForeignKey(AirStation, on_delete=models.CASCADE, related_name='archives')
+    day = models.DateField(db_index=True)
+    # Relative to ARCHIVE_ROOT
+    path = models.CharField(max_length=255)
+    row_count = models.PositiveIntegerField()
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
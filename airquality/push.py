@@ -0,0 +1,275 @@
+import codecs
+import csv
+import datetime
+import gzip
+import json
+
+from django.conf import settings
+from django.utils import timezone
+import numpy as np
+
+from .ingestion import IngestResult, _from_micros, ingest_frame, readings_changed
+from .merge import EPOCH, METRIC_FIELDS, ONE_MICROSECOND, merge_frames, merge_tolerance, metric_bits
+from .models import AirStation, station_slug
+from .registry import registry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NDJSON_TYPES = {'application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines'}
+CSV_TYPES = {'text/csv', 'application/csv'}
+
+# Plausible ranges of the campus sensors (PMS5003, DHT22); values outside them are rejected
+VALUE_LIMITS = {
+    'pm1': (0, 1000),
+    'pm25': (0, 1000),
+    'pm10': (0, 1000),
+    'temperature': (-40, 80),
+    'humidity': (0, 100),
+}
+
+# Readings this far ahead of the server clock are rejected, allowing for gateway clock drift
+MAX_CLOCK_SKEW = datetime.timedelta(minutes=5)
+
+_NAT = np.iinfo(np.int64).min
+# Epoch seconds of the first and last moment a datetime can hold
+_MIN_EPOCH = (datetime.datetime.min.replace(tzinfo=datetime.timezone.utc) - EPOCH).total_seconds()
+_MAX_EPOCH = (datetime.datetime.max.replace(tzinfo=datetime.timezone.utc) - EPOCH).total_seconds()
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+class PushError(Exception):
+    # The body as a whole can't be read, e.g. a CSV without the required columns
+    pass
+
+
+def iter_lines(stream, content_encoding=''):
+    # Decoded text lines of a request body, read as it arrives; gzip bodies are unpacked on the fly
+    if content_encoding.strip().lower() == 'gzip':
+        stream = gzip.GzipFile(fileobj=stream)
+    return codecs.iterdecode(iter(stream.readline, b''), 'utf-8-sig')
+
+
+def iter_ndjson(lines):
+    # (line number, record dict or error message) per non-blank line
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = _loads(line)
+        except ValueError:
+            yield number, 'Invalid JSON.'
+            continue
+        if not isinstance(record, dict):
+            yield number, 'Expected a JSON object.'
+            continue
+        yield number, record
+
+
+def iter_csv(lines):
+    # (line number, record dict) per CSV row; the header names the columns
+    reader = csv.DictReader(lines)
+    columns = set(reader.fieldnames or ())
+    if not columns & {'station', 'station_id'} or 'timestamp' not in columns:
+        raise PushError('CSV header must include station (or station_id) and timestamp columns.')
+    for record in reader:
+        yield reader.line_num, record
+
+
+def parse_records(stream, content_type, content_encoding=''):
+    lines = iter_lines(stream, content_encoding)
+    if content_type in CSV_TYPES:
+        return iter_csv(lines)
+    return iter_ndjson(lines)
+
+
+def _station_key(record):
+    value = record.get('station')
+    if value in (None, ''):
+        value = record.get('station_id')
+    if value in (None, ''):
+        return ''
+    # Ids as they are, names as their slug (see registry.resolve())
+    value = str(value).strip()
+    return value if value.isdigit() else station_slug(value)
+
+
+def _parse_timestamp(value):
+    # Epoch microseconds of an ISO 8601 string or epoch seconds; naive times are UTC
+    if isinstance(value, str):
+        value = value.strip()
+        try:
+            value = float(value)
+        except ValueError:
+            try:
+                dt = datetime.datetime.fromisoformat(value)
+            except ValueError:
+                return _NAT
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=datetime.timezone.utc)
+            return (dt - EPOCH) // ONE_MICROSECOND
+    # Outside datetime's range (years 1-9999) is invalid, and would overflow the int64 column; NaN fails both checks
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and _MIN_EPOCH <= value <= _MAX_EPOCH:
+        return int(value * 1_000_000)
+    return _NAT
+
+
+def _column(records, field):
+    # One metric as float64, NaN where missing; a column with bad cells is converted cell by cell
+    cells = [record.get(field) for record in records]
+    cells = ['nan' if cell is None or cell == '' else cell for cell in cells]
+    try:
+        return np.array(cells, dtype=np.float64), None
+    except (TypeError, ValueError):
+        values = np.empty(len(cells), dtype=np.float64)
+        bad = np.zeros(len(cells), dtype=bool)
+        for i, cell in enumerate(cells):
+            try:
+                values[i] = float(cell)
+            except (TypeError, ValueError):
+                values[i] = np.nan
+                bad[i] = True
+        return values, bad
+
+
+def validate_batch(records):
+    """
+    Check a batch of (line, record) pairs column-wise. Returns the station
+    ids, epoch-microsecond timestamps and metric matrix of the valid rows,
+    plus (line, message) for every rejected one.
+    """
+    # Lines that didn't parse arrive as an error message instead of a record
+    errors = {line: record for line, record in records if not isinstance(record, dict)}
+    parsed = [(line, record) for line, record in records if isinstance(record, dict)]
+    lines = np.array([line for line, _ in parsed], dtype=np.int64)
+
+    def reject(mask, message):
+        for line in lines[mask].tolist():
+            errors.setdefault(line, message)
+
+    rows = [record for _, record in parsed]
+
+    keys = [_station_key(record) for record in rows]
+    resolved = registry.resolve({key for key in keys if key})
+    stations = np.array([resolved.get(key, -1) for key in keys], dtype=np.int64)
+    reject(np.array([not key for key in keys], dtype=bool), 'Missing station.')
+    reject(stations < 0, 'Unknown station.')
+
+    ts = np.fromiter((_parse_timestamp(record.get('timestamp')) for record in rows), dtype=np.int64, count=len(rows))
+    reject(ts == _NAT, 'Missing or invalid timestamp.')
+    latest = (timezone.now() + MAX_CLOCK_SKEW - EPOCH) // ONE_MICROSECOND
+    reject((ts != _NAT) & (ts > latest), 'Timestamp is in the future.')
+
+    values = np.empty((len(rows), len(METRIC_FIELDS)), dtype=np.float64)
+    for column, field in enumerate(METRIC_FIELDS):
+        values[:, column], bad = _column(rows, field)
+        if bad is not None:
+            reject(bad, f'{field} is not a number.')
+        low, high = VALUE_LIMITS[field]
+        with np.errstate(invalid='ignore'):
+            reject(np.isinf(values[:, column]) | (values[:, column] < low) | (values[:, column] > high),
+                   f'{field} must be between {low} and {high}.')
+    reject(np.isnan(values).all(axis=1), 'No metric values.')
+
+    valid = ~np.isin(lines, list(errors))
+    return stations[valid], ts[valid], values[valid], sorted(errors.items())
+
+
+def merge_station_rows(ts, values, tolerance):
+    """
+    Merge one station's pushed rows into a frame with a row per moment.
+    Rows carrying the same set of metrics come from the same sensor; each
+    such stream is as-of merged into the others, as merge_streams() does
+    for upstream data.
+    """
+    bits = metric_bits(values)
+    frames = []
+    for pattern in np.unique(bits):
+        rows = np.nonzero(bits == pattern)[0]
+        order = rows[np.argsort(ts[rows], kind='stable')]
+        frames.append((ts[order], values[order]))
+    merged = frames[0]
+    for frame in frames[1:]:
+        merged = merge_frames(merged, frame, tolerance)
+    return merged
+
+
+def store_batch(stations, ts, values, batch_size, touched):
+    """
+    ingest_frame() per station in the batch, leaving the refresh of station
+    summaries and rollups to the caller: `touched` collects each station,
+    the time range written and the readings inserted. Returns the summed
+    IngestResult.
+    """
+    inserted = skipped = merged = 0
+    tolerance = merge_tolerance()
+    by_id = AirStation.objects.in_bulk(np.unique(stations).tolist())
+    for station_id, station in by_id.items():
+        mine = stations == station_id
+        frame = merge_station_rows(ts[mine], values[mine], tolerance)
+        result = ingest_frame(station, *frame, batch_size=batch_size, refresh=False)
+        inserted += result.inserted
+        skipped += result.skipped
+        merged += result.merged + int(mine.sum()) - len(frame[0])
+        if result.inserted or result.merged:
+            # Rows merged into stored readings may sit up to the tolerance outside the pushed range
+            low, high = int(ts[mine].min()) - tolerance, int(ts[mine].max()) + tolerance
+            added = result.inserted
+            if station_id in touched:
+                _, touched_low, touched_high, touched_added = touched[station_id]
+                low, high, added = min(low, touched_low), max(high, touched_high), added + touched_added
+            touched[station_id] = (station, low, high, added)
+    for station_id in set(np.unique(stations).tolist()) - set(by_id):
+        # Deleted since the registry was loaded
+        registry.invalidate()
+        skipped += int((stations == station_id).sum())
+    return IngestResult(inserted, skipped, merged)
+
+
+def push_readings(records, batch_size=None, max_errors=None):
+    """
+    Validate and store (line, record) pairs from parse_records() in batches
+    of `batch_size`, so memory stays flat however large the body is. Each
+    batch is stored as soon as it is validated; a bad row only rejects
+    itself. Station summaries and rollups are refreshed once per station at
+    the end. Returns the counts and the first `max_errors` row errors.
+    """
+    batch_size = batch_size or getattr(settings, 'PUSH_BATCH_SIZE', 5000)
+    max_errors = getattr(settings, 'PUSH_MAX_ERRORS', 100) if max_errors is None else max_errors
+    received = inserted = skipped = merged = rejected = 0
+    errors = []
+    batch = []
+    touched = {}
+
+    def flush(batch):
+        nonlocal inserted, skipped, merged, rejected
+        stations, ts, values, batch_errors = validate_batch(batch)
+        rejected += len(batch_errors)
+        errors.extend({'line': line, 'error': message} for line, message in batch_errors[:max_errors - len(errors)])
+        if len(ts):
+            result = store_batch(stations, ts, values, batch_size, touched)
+            inserted += result.inserted
+            skipped += result.skipped
+            merged += result.merged
+
+    for record in records:
+        received += 1
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    for station, low, high, added in touched.values():
+        readings_changed(station, _from_micros(low), _from_micros(high), added)
+    return {
+        'received': received,
+        'inserted': inserted,
+        'merged': merged,
+        'skipped': skipped,
+        'rejected': rejected,
+        'errors': errors,
+    }
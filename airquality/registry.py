@@ -0,0 +1,114 @@
+from collections import defaultdict
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import AirStation, Sensor, station_slug
+
+# Misses reload the registry at most this often, so unknown names can't force a query per request
+MISS_RELOAD_INTERVAL = 5
+
+
+class SensorRegistry:
+    """
+    Process-local copy of the Sensor and AirStation tables, so ingestion
+    and lookups resolve sensor and station ids without a query per item.
+
+    Loaded with two queries on first use. Changes saved in this process
+    drop it at once (see the signal receivers below); changes made by other
+    processes are picked up after `ttl` seconds, or sooner when a lookup
+    misses.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._data = None
+        self._loaded = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+
+    def _get(self, reload_after=None):
+        ttl = self.ttl if self.ttl is not None else getattr(settings, 'SENSOR_REGISTRY_TTL', 300)
+        with self._lock:
+            age = time.monotonic() - self._loaded
+            if self._data is not None and age <= ttl and (reload_after is None or age <= reload_after):
+                return self._data
+        data = self._load()
+        with self._lock:
+            self._data = data
+            self._loaded = time.monotonic()
+        return data
+
+    def _load(self):
+        names = {}
+        slugs = defaultdict(list)
+        for station_id, name, slug in AirStation.objects.order_by('id').values_list('id', 'name', 'slug'):
+            names[station_id] = name
+            slugs[slug].append(station_id)
+        sensors = {}
+        sensor_rows = Sensor.objects.filter(active=True).order_by('station_id', 'id').values_list(
+            'id', 'station_id', 'type', 'label', 'lat', 'lon')
+        for sensor_id, station_id, sensor_type, label, lat, lon in sensor_rows:
+            sensors[sensor_id] = {
+                'station': names[station_id],
+                'station_id': station_id,
+                'lat': lat,
+                'lon': lon,
+                'type': sensor_type,
+                'label': label,
+            }
+        return sensors, names, dict(slugs)
+
+    def sensor_metadata(self):
+        # {sensor_id: {'station', 'station_id', 'lat', 'lon', 'type', 'label'}} for every active sensor
+        return dict(self._get()[0])
+
+    def _match(self, data, key):
+        _, names, slugs = data
+        if key.isdigit():
+            return [int(key)] if int(key) in names else []
+        return slugs.get(station_slug(key), [])
+
+    def station_ids(self, value):
+        # Ids of the stations a station id or name refers to; names match on their slug
+        key = str(value).strip()
+        ids = self._match(self._get(), key)
+        if not ids:
+            ids = self._match(self._get(reload_after=MISS_RELOAD_INTERVAL), key)
+        return ids
+
+    def _resolve(self, data, keys):
+        found = {}
+        for key in keys:
+            ids = self._match(data, key)
+            if ids:
+                found[key] = ids[0]
+        return found
+
+    def resolve(self, keys):
+        # {key: station id} for the station ids and names among `keys` that exist; duplicate names go to the oldest
+        found = self._resolve(self._get(), keys)
+        if len(found) < len(keys):
+            found = self._resolve(self._get(reload_after=MISS_RELOAD_INTERVAL), keys)
+        return found
+
+
+registry = SensorRegistry()
+
+
+@receiver([post_save, post_delete], sender=Sensor)
+def sensor_changed(sender, **kwargs):
+    registry.invalidate()
+
+
+@receiver([post_save, post_delete], sender=AirStation)
+def station_changed(sender, update_fields=None, **kwargs):
+    # Summary refreshes save the station after every write; they don't touch what the registry holds
+    if update_fields is None or 'name' in update_fields:
+        registry.invalidate()
@@ -0,0 +1,200 @@
+import datetime
+import gzip
+import heapq
+from itertools import chain, groupby
+import json
+import os
+import time
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .exporters import EXPORT_CHUNK_SIZE, EXPORT_FIELDS
+from .models import AirQualityReading, ReadingArchive
+
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def archive_root():
+    return str(getattr(settings, 'ARCHIVE_ROOT', settings.BASE_DIR / 'archive'))
+
+
+def retention_cutoff(days=None, now=None):
+    """
+    Start of the oldest UTC day whose raw readings are kept, or None when
+    retention is off. Whole days are pruned so daily rollups stay complete.
+    """
+    days = getattr(settings, 'RETENTION_RAW_DAYS', 90) if days is None else days
+    if not days:
+        return None
+    now = (now or timezone.now()).astimezone(datetime.timezone.utc)
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - datetime.timedelta(days=days)
+
+
+def _day_bounds(day):
+    start = datetime.datetime.combine(day, datetime.time.min, tzinfo=datetime.timezone.utc)
+    return start, start + ONE_DAY
+
+
+def _encode_row(row):
+    # Rows are EXPORT_FIELDS tuples; timestamps are stored as ISO strings
+    return json.dumps([row[0], row[1], row[2].isoformat(), *row[3:]], separators=(',', ':'))
+
+
+def _decode_row(line):
+    row = json.loads(line)
+    row[2] = datetime.datetime.fromisoformat(row[2])
+    return tuple(row)
+
+
+def write_archive(station, day, rows):
+    """
+    Write one day of a station's readings (EXPORT_FIELDS tuples ordered by
+    timestamp, id) to a gzipped NDJSON file and record it. The file is
+    written under a temporary name and renamed, so readers never see half of it.
+    """
+    relative = os.path.join(str(station.id), f'{day.isoformat()}-{rows[0][0]}.ndjson.gz')
+    path = os.path.join(archive_root(), relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+        for row in rows:
+            f.write(_encode_row(row))
+            f.write('\n')
+    os.replace(path + '.tmp', path)
+    ids = [row[0] for row in rows]
+    return ReadingArchive.objects.create(
+        station=station, day=day, path=relative, row_count=len(rows),
+        first_id=min(ids), last_id=max(ids), size=os.path.getsize(path),
+    )
+
+
+def delete_in_batches(queryset, batch_size, pause=0):
+    """
+    Delete the rows of `queryset` in id order, at most `batch_size` per
+    statement, each in its own transaction so no lock is held for long.
+    """
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        queryset.filter(id__lte=ids[-1]).delete()
+        deleted += len(ids)
+        if pause:
+            time.sleep(pause)
+
+
+def prune_station(station, cutoff, archive=True, batch_size=None, pause=0):
+    """
+    Remove the raw readings of `station` older than `cutoff` one UTC day at
+    a time, archiving each day first when `archive` is set. Rollups are not
+    touched. Safe to re-run after an interruption: rows already covered by
+    an archive file are deleted without being written again.
+    Returns (archived, deleted).
+    """
+    batch_size = batch_size or getattr(settings, 'RETENTION_BATCH_SIZE', 5000)
+    old = AirQualityReading.objects.filter(station=station, timestamp__lt=cutoff)
+    first = old.order_by('timestamp').values_list('timestamp', flat=True).first()
+    archived = deleted = 0
+    day = first.astimezone(datetime.timezone.utc).date() if first else None
+    while day is not None and _day_bounds(day)[0] < cutoff:
+        start, end = _day_bounds(day)
+        day_rows = old.filter(timestamp__gte=start, timestamp__lt=end)
+        if archive:
+            done = ReadingArchive.objects.filter(station=station, day=day).aggregate(last=Max('last_id'))['last']
+            if done is not None:
+                deleted += delete_in_batches(day_rows.filter(id__lte=done), batch_size, pause)
+            rows = list(day_rows.order_by('timestamp', 'id').values_list(*EXPORT_FIELDS))
+            if rows:
+                write_archive(station, day, rows)
+                archived += len(rows)
+        deleted += delete_in_batches(day_rows, batch_size, pause)
+        next_ts = old.filter(timestamp__gte=end).order_by('timestamp').values_list('timestamp', flat=True).first()
+        day = next_ts.astimezone(datetime.timezone.utc).date() if next_ts else None
+    if station.pruned_before is None or station.pruned_before < cutoff:
+        station.pruned_before = cutoff
+        station.save(update_fields=['pruned_before'])
+    if deleted:
+        station.refresh_summary()
+    return archived, deleted
+
+
+def _read_archive(archive):
+    with gzip.open(os.path.join(archive_root(), archive.path), 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield _decode_row(line)
+
+
+def unique_rows(rows):
+    """
+    Drop repeats of a (station, timestamp) from rows ordered by (timestamp,
+    id), keeping the first, e.g. a reading both archived and re-ingested.
+    """
+    current = None
+    seen = set()
+    for row in rows:
+        if row[2] != current:
+            current = row[2]
+            seen = set()
+        if row[1] in seen:
+            continue
+        seen.add(row[1])
+        yield row
+
+
+def archived_row_chunks(stations, lower=None, upper=None, aqi_gte=None, aqi_lte=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield lists of EXPORT_FIELDS tuples from the archives of `stations`
+    within [lower, upper), ordered by timestamp then id like the live
+    export. Files of the same day are merged as they are read.
+    """
+    archives = ReadingArchive.objects.filter(station__in=stations)
+    if lower is not None:
+        archives = archives.filter(day__gte=lower.astimezone(datetime.timezone.utc).date())
+    if upper is not None:
+        archives = archives.filter(day__lte=upper.astimezone(datetime.timezone.utc).date())
+    chunk = []
+    for _, day_archives in groupby(archives.order_by('day', 'id'), key=lambda archive: archive.day):
+        rows = unique_rows(heapq.merge(*(_read_archive(archive) for archive in day_archives), key=lambda row: (row[2], row[0])))
+        for row in rows:
+            if lower is not None and row[2] < lower:
+                continue
+            if upper is not None and row[2] >= upper:
+                continue
+            if aqi_gte is not None and (row[3] is None or row[3] < aqi_gte):
+                continue
+            if aqi_lte is not None and (row[3] is None or row[3] > aqi_lte):
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def merge_row_chunks(*sources, chunk_size=EXPORT_CHUNK_SIZE):
+    # Merge chunk streams that are each ordered by (timestamp, id), e.g. archived and live rows
+    started = []
+    for source in sources:
+        source = iter(source)
+        first = next(source, None)
+        if first:
+            started.append(chain([first], source))
+    if len(started) == 1:
+        # The usual case (no archives in range) passes straight through
+        yield from started[0]
+        return
+    rows = heapq.merge(*((row for chunk in source for row in chunk) for source in started), key=lambda row: (row[2], row[0]))
+    # A reading can be archived and live at once if it was written again after retention ran
+    rows = unique_rows(rows)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
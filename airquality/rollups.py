@@ -0,0 +1,114 @@
+import datetime
+import math
+
+from django.db import transaction
+
+from .merge import METRIC_FIELDS
+from .models import AirStation, AirQualityReading, DailyRollup, HourlyRollup
+
+# bucket name -> (model, bucket width)
+BUCKETS = {
+    'hour': (HourlyRollup, datetime.timedelta(hours=1)),
+    'day': (DailyRollup, datetime.timedelta(days=1)),
+}
+
+# Days of raw readings loaded per refresh pass
+REFRESH_WINDOW = datetime.timedelta(days=7)
+
+
+def bucket_floor(ts, bucket):
+    ts = ts.astimezone(datetime.timezone.utc)
+    if bucket == 'day':
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def percentile(sorted_values, q):
+    # Linear interpolation between closest ranks, as numpy.percentile does by default
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * q
+    lo = math.floor(k)
+    hi = math.ceil(k)
+    if lo == hi:
+        return sorted_values[lo]
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarise(values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return {'min': None, 'max': None, 'mean': None, 'p95': None}
+    return {
+        'min': values[0],
+        'max': values[-1],
+        'mean': sum(values) / len(values),
+        'p95': percentile(values, 0.95),
+    }
+
+
+def build_rollups(model, station, bucket, rows):
+    # rows: iterable of (timestamp, pm1, pm25, pm10, temperature, humidity), any order
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(bucket_floor(row[0], bucket), []).append(row)
+    rollups = []
+    for bucket_start, bucket_rows in grouped.items():
+        fields = {'count': len(bucket_rows)}
+        for i, metric in enumerate(METRIC_FIELDS, start=1):
+            for stat, value in summarise(row[i] for row in bucket_rows).items():
+                fields[f'{metric}_{stat}'] = value
+        rollups.append(model(station=station, bucket_start=bucket_start, **fields))
+    return rollups
+
+
+def refresh_rollups(station, start, end):
+    """
+    Recompute every hourly and daily bucket of `station` touched by the
+    closed range [start, end]. Readings are read a few days at a time, so
+    cost follows the size of the ingested batch and memory stays bounded.
+    Buckets before the station's retention cutoff are final and left alone.
+    """
+    pruned_before = _pruned_before(station)
+    if pruned_before is not None:
+        if end < pruned_before:
+            return
+        start = max(start, pruned_before)
+    lower = bucket_floor(start, 'day')
+    last_day = bucket_floor(end, 'day')
+    while lower <= last_day:
+        upper = min(lower + REFRESH_WINDOW, last_day + BUCKETS['day'][1])
+        _refresh_window(station, lower, upper)
+        lower = upper
+
+
+def _refresh_window(station, lower, upper):
+    rows = list(
+        AirQualityReading.objects.filter(station=station, timestamp__gte=lower, timestamp__lt=upper)
+        .values_list('timestamp', *METRIC_FIELDS)
+    )
+    with transaction.atomic():
+        for bucket, (model, _) in BUCKETS.items():
+            model.objects.filter(station=station, bucket_start__gte=lower, bucket_start__lt=upper).delete()
+            model.objects.bulk_create(build_rollups(model, station, bucket, rows))
+
+
+def _pruned_before(station):
+    # Read fresh: long-lived callers (e.g. ingest_daemon) hold station objects across retention runs
+    return AirStation.objects.filter(pk=station.pk).values_list('pruned_before', flat=True).first()
+
+
+def rebuild_rollups(station):
+    # Drop and recompute a station's rollups, except those whose raw readings retention removed
+    pruned_before = _pruned_before(station)
+    for model, _ in BUCKETS.values():
+        rollups = model.objects.filter(station=station)
+        if pruned_before is not None:
+            rollups = rollups.filter(bucket_start__gte=pruned_before)
+        rollups.delete()
+    readings = AirQualityReading.objects.filter(station=station)
+    first = readings.order_by('timestamp').values_list('timestamp', flat=True).first()
+    last = readings.order_by('-timestamp').values_list('timestamp', flat=True).first()
+    if first is not None:
+        refresh_rollups(station, first, last)
+    station.touch()
@@ -1,13 +1,108 @@
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
-from .models import AirStation, AirQualityReading
+from .aqi import compute_aqi
+from .merge import METRIC_FIELDS
+from .models import AirStation, AirQualityReading, DailyRollup, HourlyRollup, RollingWindow
+
+# values() columns read by the fast path, in AirQualityReadingSerializer's output order
+FAST_READING_VALUES = ['id', 'timestamp', 'aqi', *METRIC_FIELDS, 'station_id']
 
 class AirQualityReadingSerializer(serializers.ModelSerializer):
     class Meta:
         model = AirQualityReading
         fields = '__all__'
+        # Derived from pm25 and pm10 on every API write, as ingestion does
+        read_only_fields = ['aqi']
+
+    def create(self, validated_data):
+        validated_data['aqi'] = compute_aqi(validated_data.get('pm25'), validated_data.get('pm10'))
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        # Partial updates keep the stored value of whichever concentration isn't sent
+        validated_data['aqi'] = compute_aqi(
+            validated_data.get('pm25', instance.pm25), validated_data.get('pm10', instance.pm10),
+        )
+        return super().update(instance, validated_data)
+
+def _datetime_formatter():
+    # Matches DRF's DateTimeField output: ISO 8601 in the current time zone, UTC as 'Z'
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def format_datetime(value):
+        if value is None:
+            return None
+        if tz is not None and value.tzinfo is not None and value.tzinfo != tz:
+            value = value.astimezone(tz)
+        text = value.isoformat()
+        if text.endswith('+00:00'):
+            text = text[:-6] + 'Z'
+        return text
+    return format_datetime
+
+class FastReadingListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # One tight loop over values() rows instead of a field-by-field pass per object
+        format_datetime = _datetime_formatter()
+        return [
+            {
+                'id': row['id'],
+                'timestamp': format_datetime(row['timestamp']),
+                'aqi': row['aqi'],
+                'pm1': row['pm1'],
+                'pm25': row['pm25'],
+                'pm10': row['pm10'],
+                'temperature': row['temperature'],
+                'humidity': row['humidity'],
+                'station': row['station_id'],
+            }
+            for row in data
+        ]
+
+class AirQualityReadingFastSerializer(serializers.BaseSerializer):
+    """
+    Read-only fast path for listing readings. Takes rows from
+    queryset.values(*FAST_READING_VALUES) and produces exactly what
+    AirQualityReadingSerializer produces for the same readings.
+    """
+    class Meta:
+        list_serializer_class = FastReadingListSerializer
+
+    def to_representation(self, instance):
+        return FastReadingListSerializer(child=self).to_representation([instance])[0]
+
+class RollingWindowSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RollingWindow
+        exclude = ['station', 'buckets', 'updated_at']
 
 class AirStationSerializer(serializers.ModelSerializer):
-    readings = AirQualityReadingSerializer(many=True, read_only=True)
+    latest_reading = AirQualityReadingSerializer(read_only=True)
+    # Trailing 1h/8h/24h PM averages and NowCast, maintained on ingest; null before the first refresh
+    rolling = RollingWindowSerializer(source='window', read_only=True)
+    # Only present with ?expand=readings; holds the station's most recent readings
+    readings = serializers.SerializerMethodField()
+
     class Meta:
         model = AirStation
-        fields = ['id', 'name', 'location', 'readings'] 
\ No newline at end of file
+        fields = ['id', 'name', 'location', 'reading_count', 'first_timestamp', 'last_timestamp', 'latest_reading', 'rolling', 'readings']
+        read_only_fields = ['reading_count', 'first_timestamp', 'last_timestamp']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.context.get('expand_readings'):
+            self.fields.pop('readings')
+
+    def get_readings(self, obj):
+        return AirQualityReadingSerializer(getattr(obj, 'recent_readings', []), many=True).data
+
+class HourlyRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HourlyRollup
+        exclude = ['id']
+
+class DailyRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailyRollup
+        exclude = ['id']
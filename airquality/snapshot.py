@@ -0,0 +1,160 @@
+from collections import defaultdict
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .fetch import as_items, get_client
+from .ingestion import normalise_item
+from .merge import METRIC_FIELDS, from_frame, merge_streams
+from .models import RollingWindow
+from .serializers import RollingWindowSerializer
+from .writebehind import get_writer
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_CACHE_KEY = 'airquality:now-snapshot'
+REFRESH_LOCK_KEY = 'airquality:now-snapshot:refreshing'
+
+
+def build_now_snapshot(sensor_metadata, previous=None):
+    """
+    Fetch the latest reading of every sensor, queue them for storage and
+    return one merged PMS + DHT record per station and moment, with the
+    station's rolling averages as of the readings already stored.
+
+    Sensors whose fetch fails keep their rows from `previous` ({sensor_id:
+    rows} of an earlier snapshot). Returns (results, {sensor_id: rows},
+    number of sensors fetched).
+    """
+    previous = previous or {}
+    sensor_ids = list(sensor_metadata.keys())
+    # All sensors are fetched concurrently over one pooled session
+    responses = get_client().fetch_now(sensor_ids)
+    # One stream of normalised rows per sensor, grouped by station
+    streams = defaultdict(list)
+    sensor_rows = {}
+    for sid in sensor_ids:
+        data = responses.get(sid)
+        meta = sensor_metadata.get(sid)
+        if not meta:
+            continue
+        if data is None:
+            # Upstream failed for this sensor: its last known rows, if any
+            if sid in previous:
+                sensor_rows[sid] = previous[sid]
+                streams[meta['station_id']].append((meta, previous[sid]))
+            continue
+        items = as_items(data)
+        rows = [row for row in (normalise_item(item) for item in items) if row is not None]
+        sensor_rows[sid] = rows
+        streams[meta['station_id']].append((meta, rows))
+        # Stored in the background in batches; the response doesn't wait for the database
+        get_writer().submit(meta, items)
+    # One query for every station's precomputed windows
+    windows = {
+        window.station_id: RollingWindowSerializer(window).data
+        for window in RollingWindow.objects.filter(station_id__in=list(streams))
+    }
+    # As-of merge of each station's sensors, within the merge tolerance
+    results = []
+    for station_id, sensors in streams.items():
+        meta = sensors[0][0]
+        for row in from_frame(*merge_streams([rows for _, rows in sensors])):
+            results.append({
+                'station': meta['station'],
+                'lat': meta['lat'],
+                'lon': meta['lon'],
+                'timestamp': row['timestamp'].isoformat(),
+                **{field: row[field] for field in METRIC_FIELDS},
+                'rolling': windows.get(station_id),
+            })
+    fetched = sum(responses.get(sid) is not None for sid in sensor_ids)
+    return results, sensor_rows, fetched
+
+
+def _settings():
+    ttl = getattr(settings, 'NOW_SNAPSHOT_TTL', 60)
+    # Stale snapshots are kept this long so they can be served during a refresh
+    max_stale = getattr(settings, 'NOW_SNAPSHOT_MAX_STALE', ttl * 10)
+    # Upper bound on one refresh; the single-flight lock expires after it
+    lock_timeout = getattr(settings, 'NOW_SNAPSHOT_LOCK_TIMEOUT', 30)
+    return ttl, max_stale, lock_timeout
+
+
+def _store_snapshot(sensor_metadata):
+    ttl, max_stale, _ = _settings()
+    cached = cache.get(SNAPSHOT_CACHE_KEY)
+    results, sensor_rows, fetched = build_now_snapshot(sensor_metadata, cached and cached.get('sensors'))
+    if not fetched and cached is not None:
+        # Upstream is down: keep serving the last snapshot, stale, rather than an empty one
+        logger.warning('Every sensor failed upstream; keeping the previous now snapshot')
+        return
+    cache.set(
+        SNAPSHOT_CACHE_KEY,
+        {'results': results, 'sensors': sensor_rows, 'fetched_at': time.time()},
+        ttl + max_stale,
+    )
+
+
+def _acquire_refresh_lock():
+    # cache.add() is atomic, so only one caller per lock period gets to refresh
+    _, _, lock_timeout = _settings()
+    return cache.add(REFRESH_LOCK_KEY, True, lock_timeout)
+
+
+def refresh_now_snapshot(sensor_metadata):
+    # Returns False without fetching if another refresh is already running
+    if not _acquire_refresh_lock():
+        return False
+    try:
+        _store_snapshot(sensor_metadata)
+    finally:
+        cache.delete(REFRESH_LOCK_KEY)
+    return True
+
+
+def _refresh_in_background(sensor_metadata):
+    if not _acquire_refresh_lock():
+        return
+
+    def run():
+        try:
+            _store_snapshot(sensor_metadata)
+        except Exception:
+            logger.exception('Background refresh of the now snapshot failed')
+        finally:
+            cache.delete(REFRESH_LOCK_KEY)
+            connection.close()
+    threading.Thread(target=run, name='now-snapshot-refresh', daemon=True).start()
+
+
+def get_now_snapshot(sensor_metadata):
+    """
+    Return (results, age in seconds). Fresh snapshots come straight from
+    the cache; stale ones are returned while a background refresh runs.
+    With no snapshot at all the caller refreshes synchronously, or waits
+    for the refresh another worker already started.
+    """
+    ttl, max_stale, lock_timeout = _settings()
+    cached = cache.get(SNAPSHOT_CACHE_KEY)
+    if cached is not None:
+        age = time.time() - cached['fetched_at']
+        if age > ttl:
+            _refresh_in_background(sensor_metadata)
+        return cached['results'], age
+
+    if not refresh_now_snapshot(sensor_metadata):
+        deadline = time.time() + lock_timeout
+        while time.time() < deadline:
+            time.sleep(0.1)
+            cached = cache.get(SNAPSHOT_CACHE_KEY)
+            if cached is not None:
+                return cached['results'], time.time() - cached['fetched_at']
+        # The other refresh never finished; fetch directly rather than fail
+        return build_now_snapshot(sensor_metadata)[0], 0
+    cached = cache.get(SNAPSHOT_CACHE_KEY)
+    return cached['results'], time.time() - cached['fetched_at']
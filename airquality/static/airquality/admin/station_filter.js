@@ -0,0 +1,16 @@
+'use strict';
+{
+    const $ = django.jQuery;
+
+    // Reload the changelist filtered on the station picked in StationFilter's autocomplete box
+    $(function() {
+        $('.station-filter select').on('change', function() {
+            const container = $(this).closest('.station-filter');
+            const params = new URLSearchParams(container.data('query-string'));
+            if (this.value) {
+                params.set(container.data('parameter'), this.value);
+            }
+            window.location.search = params.toString();
+        });
+    });
+}
@@ -0,0 +1,126 @@
+import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from django.utils.dateparse import parse_datetime
+
+# Start of the synthetic measurement history served by the stub
+STUB_EPOCH = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def stub_measurement(sensor_type, index, timestamp):
+    # Deterministic, non-zero values so repeated runs ingest identical data
+    if 'PMS' in sensor_type:
+        values = [
+            {'value_type': 'P0', 'value': f'{3 + index % 7:.1f}'},
+            {'value_type': 'P2', 'value': f'{8 + index % 40:.1f}'},
+            {'value_type': 'P1', 'value': f'{15 + index % 60:.1f}'},
+        ]
+    else:
+        values = []
+    if 'DHT' in sensor_type:
+        values += [
+            {'value_type': 'temperature', 'value': f'{18 + index % 10:.1f}'},
+            {'value_type': 'humidity', 'value': f'{45 + index % 30:.1f}'},
+        ]
+    return {'timestamp': timestamp.isoformat(), 'sensordatavalues': values}
+
+
+class SensorsAfricaStub:
+    """
+    Local stand-in for the Sensors.Africa API serving `now/` and paginated
+    `measurements/` for the sensors in a registry.sensor_metadata()-style dict.
+
+    Each sensor has `measurements` readings `interval` apart from
+    STUB_EPOCH; `latency` seconds are added to every response to mimic the
+    real upstream. Point SENSORS_AFRICA['BASE_URL'] at `base_url`.
+    """
+
+    def __init__(self, sensor_metadata, measurements=1440, interval=datetime.timedelta(minutes=1),
+                 page_size=100, latency=0.0):
+        self.sensor_metadata = sensor_metadata
+        self.measurements = measurements
+        self.interval = interval
+        self.page_size = page_size
+        self.latency = latency
+        self.requests = 0
+        self.server = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server.server_port}'
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.requests += 1
+                status, body = stub.respond(self.path)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='sensors-africa-stub', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def respond(self, path):
+        url = urlparse(path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        try:
+            sid = int(params['sensor_id'])
+            sensor_type = self.sensor_metadata[sid]['type']
+        except (KeyError, ValueError):
+            return 404, {'detail': 'Unknown sensor.'}
+        route = url.path.strip('/').split('/')[-1]
+        if route == 'now':
+            index = self.measurements - 1
+            return 200, [stub_measurement(sensor_type, index, STUB_EPOCH + index * self.interval)]
+        if route != 'measurements':
+            return 404, {'detail': 'Not found.'}
+
+        first, last = 0, self.measurements
+        since = parse_datetime(params['timestamp__gte']) if params.get('timestamp__gte') else None
+        if since is not None:
+            first = max(0, -(-(since - STUB_EPOCH) // self.interval))
+        until = parse_datetime(params['timestamp__lte']) if params.get('timestamp__lte') else None
+        if until is not None:
+            last = min(last, (until - STUB_EPOCH) // self.interval + 1)
+        page = int(params.get('page', 1))
+        start = first + (page - 1) * self.page_size
+        end = min(last, start + self.page_size)
+        results = [
+            stub_measurement(sensor_type, index, STUB_EPOCH + index * self.interval)
+            for index in range(start, end)
+        ]
+        next_url = None
+        if end < last:
+            next_url = f'{self.base_url}{url.path}?{urlencode({**params, "page": page + 1})}'
+        return 200, {'count': max(0, last - first), 'next': next_url, 'results': results}
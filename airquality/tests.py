@@ -1,3 +1,847 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import csv
+import io
+import json
+import shutil
+import struct
+import tempfile
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+import numpy as np
+
+from .aqi import compute_aqi, compute_aqi_array
+from .backfill import Backfill
+from .daemon import IngestDaemon
+from .downsampling import ALGORITHMS, downsample_lttb, load_series
+from .exporters import COLUMNAR_MAGIC, EXPORT_COLUMNS, EXPORT_FIELDS, stream_columnar
+from .fetch import SensorsAfricaClient
+from .ingestion import IngestResult, ingest_items, ingest_streams, readings_changed
+from .live import ReadingBroker, live_readings
+from .models import AirStation, AirQualityReading, BackfillShard, ReadingArchive, RollingWindow, SensorWatermark
+from .retention import delete_in_batches, prune_station, write_archive
+from .rollups import rebuild_rollups
+from .serializers import FAST_READING_VALUES, AirQualityReadingFastSerializer, AirQualityReadingSerializer
+from .snapshot import SNAPSHOT_CACHE_KEY, refresh_now_snapshot
+from .stubs import STUB_EPOCH, SensorsAfricaStub, stub_measurement
+from .windows import nowcast, refresh_window
+from .writebehind import WriteBehindWriter
 
 # Create your tests here.
+
+MINUTE = datetime.timedelta(minutes=1)
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def stream(sensor_type, count, offset=datetime.timedelta(0)):
+    # `count` upstream items one minute apart, shifted by `offset` as a second sensor's clock would be
+    return [stub_measurement(sensor_type, i, STUB_EPOCH + i * MINUTE + offset) for i in range(count)]
+
+
+def stored(station):
+    return list(
+        AirQualityReading.objects.filter(station=station).order_by('timestamp')
+        .values_list('timestamp', 'pm1', 'pm25', 'pm10', 'temperature', 'humidity', 'aqi')
+    )
+
+
+class IngestionIdempotencyTests(TestCase):
+    def setUp(self):
+        self.station = AirStation.objects.create(name='Test Station', location='0,0')
+
+    def test_same_payload_twice(self):
+        items = stream('PMS/DHT', 60)
+        first = ingest_items(self.station, items)
+        before = stored(self.station)
+        second = ingest_items(self.station, items)
+        self.assertEqual(first.inserted, 60)
+        self.assertEqual(second.inserted, 0)
+        self.assertEqual(second.skipped, 60)
+        self.assertEqual(stored(self.station), before)
+
+    def test_merged_streams_twice(self):
+        # DHT 20s after PMS: each moment is stored as one row at the PMS timestamp
+        streams = [stream('PMS', 60), stream('DHT', 60, datetime.timedelta(seconds=20))]
+        ingest_streams(self.station, streams)
+        before = stored(self.station)
+        self.assertEqual(len(before), 60)
+        result = ingest_streams(self.station, streams)
+        self.assertEqual(result.inserted, 0)
+        self.assertEqual(stored(self.station), before)
+
+    def test_merged_item_sent_again(self):
+        pms = stream('PMS', 1)
+        dht = stream('DHT', 1, datetime.timedelta(seconds=20))
+        ingest_items(self.station, pms)
+        ingest_items(self.station, dht)
+        before = stored(self.station)
+        self.assertEqual(len(before), 1)
+        # The DHT item now lives in the 10:00:00 row; fetching it again must not add a 10:00:20 half-row
+        for items in (dht, pms, pms + dht):
+            ingest_items(self.station, items)
+            self.assertEqual(stored(self.station), before)
+
+    def test_overlapping_refetch(self):
+        # As ingest_daemon does: one sensor's pages at a time, each poll re-fetching from the watermark
+        dht_offset = datetime.timedelta(seconds=20)
+        for count in (40, 60):
+            ingest_items(self.station, stream('PMS', count)[30:])
+            ingest_items(self.station, stream('DHT', count, dht_offset)[30:])
+        ingest_items(self.station, stream('PMS', 30))
+        ingest_items(self.station, stream('DHT', 30, dht_offset))
+        rows = stored(self.station)
+        self.assertEqual(len(rows), 60)
+        self.assertTrue(all(None not in row for row in rows))
+
+
+class ChangeMarkerTests(TestCase):
+    def setUp(self):
+        self.station = AirStation.objects.create(name='Test Station', location='0,0')
+        ingest_items(self.station, stream('PMS', 10))
+
+    def marker(self):
+        return AirStation.objects.get(pk=self.station.pk).updated_at
+
+    def test_bumped_after_derived_tables(self):
+        before = self.marker()
+        seen = []
+
+        def record(*args, **kwargs):
+            seen.append(self.marker())
+        with mock.patch('airquality.ingestion.refresh_rollups', side_effect=record), \
+                mock.patch('airquality.ingestion.refresh_window', side_effect=record):
+            ingest_items(self.station, stream('PMS', 20)[10:])
+        self.assertEqual(seen, [before, before])
+        self.assertGreater(self.marker(), before)
+
+    def test_rebuild_rollups_bumps_marker(self):
+        before = self.marker()
+        rebuild_rollups(self.station)
+        self.assertGreater(self.marker(), before)
+
+
+class ReadingCursorPaginationTests(TestCase):
+    def test_shared_timestamps_each_row_once(self):
+        # Three stations reporting at the same moments: ties on timestamp straddle page boundaries
+        stations = [AirStation.objects.create(name=f'Station {i}', location='0,0') for i in range(3)]
+        AirQualityReading.objects.bulk_create([
+            AirQualityReading(station=station, timestamp=STUB_EPOCH + i * MINUTE, pm25=i)
+            for i in range(10) for station in stations
+        ])
+        expected = set(AirQualityReading.objects.values_list('id', flat=True))
+        url = '/api/airquality/readings/?page_size=4'
+        seen = []
+        while url:
+            body = self.client.get(url).json()
+            self.assertLessEqual(len(body['results']), 4)
+            seen += [row['id'] for row in body['results']]
+            url = body['next']
+        self.assertEqual(len(seen), len(expected))
+        self.assertEqual(set(seen), expected)
+
+
+class StationAggregatesTests(TestCase):
+    def setUp(self):
+        self.station = AirStation.objects.create(name='Test Station', location='0,0')
+        ingest_items(self.station, stream('PMS', 300))
+        self.url = f'/api/airquality/stations/{self.station.pk}/aggregates/'
+
+    def test_pages_through_the_window(self):
+        url = f'{self.url}?bucket=hour&start={STUB_EPOCH.date().isoformat()}&page_size=2'
+        buckets = []
+        while url:
+            body = self.client.get(url).json()
+            self.assertLessEqual(len(body['results']), 2)
+            buckets += [row['bucket_start'] for row in body['results']]
+            url = body['next']
+        self.assertEqual(len(buckets), 5)
+        self.assertEqual(buckets, sorted(set(buckets)))
+
+    def test_default_window(self):
+        # The readings are older than the default span, so an unbounded request serves none of them
+        self.assertEqual(self.client.get(f'{self.url}?bucket=hour').json()['results'], [])
+        end = (STUB_EPOCH + datetime.timedelta(days=1)).date().isoformat()
+        self.assertEqual(len(self.client.get(f'{self.url}?bucket=hour&end={end}').json()['results']), 5)
+
+
+class IngestDaemonTests(TestCase):
+    def setUp(self):
+        station = AirStation.objects.create(name='Test Station', location='0,0')
+        self.sensor_metadata = {
+            1: {'station': station.name, 'station_id': station.pk, 'lat': 0, 'lon': 0, 'type': 'PMS'},
+            2: {'station': station.name, 'station_id': station.pk, 'lat': 0, 'lon': 0, 'type': 'DHT'},
+        }
+
+    def test_writer_failure_ends_cycle(self):
+        # Many small pages against a one-page queue: the fetchers are blocked on put() when the writer fails
+        with SensorsAfricaStub(self.sensor_metadata, measurements=500, page_size=10) as stub:
+            client = SensorsAfricaClient(base_url=stub.base_url)
+            daemon = IngestDaemon(self.sensor_metadata, queue_size=1, client=client)
+            with mock.patch('airquality.daemon.ingest_items', side_effect=RuntimeError('database down')):
+                started = time.monotonic()
+                with self.assertRaises(RuntimeError):
+                    daemon.run_cycle()
+            client.close()
+        self.assertLess(time.monotonic() - started, 10)
+
+    def test_sensor_metadata_reloaded_each_cycle(self):
+        load = mock.Mock(side_effect=[{1: self.sensor_metadata[1]}, self.sensor_metadata])
+        with SensorsAfricaStub(self.sensor_metadata, measurements=5) as stub:
+            client = SensorsAfricaClient(base_url=stub.base_url)
+            daemon = IngestDaemon(load, client=client)
+            self.assertEqual(set(daemon.run_cycle()), {1})
+            self.assertFalse(SensorWatermark.objects.filter(sensor_id=2).exists())
+            self.assertEqual(set(daemon.run_cycle()), {1, 2})
+            self.assertIsNotNone(SensorWatermark.objects.get(sensor_id=2).last_polled_at)
+            client.close()
+        self.assertEqual(load.call_count, 2)
+
+
+class PushTests(TestCase):
+    def setUp(self):
+        self.station = AirStation.objects.create(name='Test Station', location='0,0')
+
+    def test_out_of_range_epoch_rejects_only_its_line(self):
+        lines = [
+            {'station': 'Test Station', 'timestamp': 1735689600, 'pm25': 10},
+            {'station': 'Test Station', 'timestamp': 1e20, 'pm25': 10},
+            {'station': 'Test Station', 'timestamp': 10 ** 400, 'pm25': 10},
+            {'station': 'Test Station', 'timestamp': '-1e20', 'pm25': 10},
+        ]
+        body = '\n'.join(json.dumps(line) for line in lines)
+        response = self.client.post('/api/airquality/readings/push/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['inserted'], 1)
+        self.assertEqual([error['line'] for error in response.json()['errors']], [2, 3, 4])
+
+
+class NowSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        station = AirStation.objects.create(name='Test Station', location='0,0')
+        self.sensor_metadata = {
+            1: {'station': station.name, 'station_id': station.pk, 'lat': 0, 'lon': 0, 'type': 'PMS'},
+            2: {'station': station.name, 'station_id': station.pk, 'lat': 0, 'lon': 0, 'type': 'DHT'},
+        }
+        patcher = mock.patch('airquality.snapshot.get_writer')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def refresh(self, responses):
+        client = mock.Mock()
+        client.fetch_now.return_value = responses
+        with mock.patch('airquality.snapshot.get_client', return_value=client):
+            refresh_now_snapshot(self.sensor_metadata)
+        return cache.get(SNAPSHOT_CACHE_KEY)['results']
+
+    def test_outage_keeps_previous_snapshot(self):
+        fresh = self.refresh({1: stream('PMS', 1), 2: stream('DHT', 1)})
+        self.assertEqual(len(fresh), 1)
+        self.assertEqual(self.refresh({1: None, 2: None}), fresh)
+
+    def test_failed_sensor_keeps_its_last_rows(self):
+        fresh = self.refresh({1: stream('PMS', 1), 2: stream('DHT', 1)})
+        partial = self.refresh({1: stream('PMS', 1), 2: None})
+        self.assertEqual(partial, fresh)
+        self.assertIsNotNone(partial[0]['temperature'])
+
+
+class DownsampleTests(TestCase):
+    def test_point_count_bound(self):
+        t = np.arange(1000, dtype=np.float64)
+        v = np.sin(t / 10)
+        for name, reduce in ALGORITHMS.items():
+            for points in (2, 3, 10, 999, 1000, 5000):
+                rt, rv = reduce(t, v, points)
+                self.assertLessEqual(len(rt), points, (name, points))
+                self.assertEqual(len(rt), len(rv))
+
+    def test_load_series_chunks(self):
+        station = AirStation.objects.create(name='Test Station', location='0,0')
+        ingest_items(station, stream('PMS', 7))
+        readings = AirQualityReading.objects.filter(station=station)
+        t, v = load_series(readings, ['pm25', 'temperature'], chunk_size=3)
+        rows = readings.order_by('timestamp')
+        self.assertEqual(t.tolist(), [row.timestamp.timestamp() * 1000 for row in rows])
+        self.assertEqual(v[:, 0].tolist(), [row.pm25 for row in rows])
+        self.assertTrue(np.isnan(v[:, 1]).all())
+        t, v = load_series(readings.none(), ['pm25'])
+        self.assertEqual((t.shape, v.shape), ((0,), (0, 1)))
+
+    def test_lttb_keeps_ends(self):
+        t = np.arange(100, dtype=np.float64)
+        for points in (2, 3, 10):
+            rt, _ = downsample_lttb(t, t ** 2, points)
+            self.assertEqual(len(rt), points)
+            self.assertEqual((rt[0], rt[-1]), (0, 99))
+
+
+class AqiTests(TestCase):
+    def test_breakpoint_edges(self):
+        cases = [
+            # (pm25, pm10, aqi)
+            (0, None, 0),
+            (9.0, None, 50),
+            (9.09, None, 50),  # truncated to 9.0
+            (9.1, None, 51),
+            (35.4, None, 100),
+            (35.5, None, 101),
+            (55.4, None, 150),
+            (55.5, None, 151),
+            (125.5, None, 201),
+            (225.5, None, 301),
+            (325.4, None, 500),
+            (325.5, None, 500),  # above the scale
+            (1000, None, 500),
+            (None, 54, 50),
+            (None, 55, 51),
+            (None, 154, 100),
+            (None, 155, 101),
+            (None, 425, 301),
+            (None, 604, 500),
+            (None, 605, 500),
+            (9.0, 155, 101),  # the larger sub-index wins
+            (None, None, None),
+        ]
+        for pm25, pm10, expected in cases:
+            self.assertEqual(compute_aqi(pm25, pm10), expected, (pm25, pm10))
+            array = compute_aqi_array(
+                [np.nan if pm25 is None else pm25], [np.nan if pm10 is None else pm10],
+            )[0]
+            self.assertEqual(None if np.isnan(array) else array, expected, (pm25, pm10))
+
+    def test_api_writes_set_aqi(self):
+        station = AirStation.objects.create(name='Test Station', location='0,0')
+        response = self.client.post('/api/airquality/readings/', {
+            'station': station.pk, 'timestamp': '2025-01-01T00:00:00Z', 'pm25': 35.5, 'pm10': 20, 'aqi': 1,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        reading = AirQualityReading.objects.get()
+        self.assertEqual(reading.aqi, 101)
+        response = self.client.patch(f'/api/airquality/readings/{reading.pk}/', {'pm10': 155}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        reading.refresh_from_db()
+        self.assertEqual(reading.aqi, 101)
+        self.client.patch(f'/api/airquality/readings/{reading.pk}/', {'pm25': 9.0, 'pm10': 10}, content_type='application/json')
+        reading.refresh_from_db()
+        self.assertEqual(reading.aqi, 50)
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings = override_settings(ARCHIVE_ROOT=root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Two stations reporting at the same moments, every 6 hours over three days
+        self.stations = [AirStation.objects.create(name=f'Station {i}', location='0,0') for i in range(2)]
+        AirQualityReading.objects.bulk_create([
+            AirQualityReading(station=station, timestamp=STUB_EPOCH + i * datetime.timedelta(hours=6), pm25=i, aqi=i)
+            for i in range(12) for station in self.stations
+        ])
+        for station in self.stations:
+            station.refresh_summary()
+        self.station = self.stations[0]
+        self.cutoff = STUB_EPOCH + datetime.timedelta(days=2)
+
+    def exported(self, query=''):
+        response = self.client.get(f'/api/airquality/readings/export/?format=ndjson{query}')
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_prunes_day_by_day(self):
+        archived, deleted = prune_station(self.station, self.cutoff, batch_size=3)
+        self.assertEqual((archived, deleted), (8, 8))
+        archives = list(ReadingArchive.objects.filter(station=self.station).order_by('day'))
+        self.assertEqual([archive.day for archive in archives], [STUB_EPOCH.date(), (STUB_EPOCH + ONE_DAY).date()])
+        self.assertEqual([archive.row_count for archive in archives], [4, 4])
+        remaining = self.station.readings.values_list('timestamp', flat=True)
+        self.assertTrue(all(ts >= self.cutoff for ts in remaining))
+        self.station.refresh_from_db()
+        self.assertEqual(self.station.pruned_before, self.cutoff)
+        self.assertEqual(self.station.reading_count, 4)
+        # The other station is untouched
+        self.assertEqual(self.stations[1].readings.count(), 12)
+
+    def test_resume_after_partial_archive(self):
+        # A run that wrote the first day's file and deleted only part of its rows before stopping
+        day_rows = self.station.readings.filter(timestamp__lt=STUB_EPOCH + ONE_DAY)
+        rows = list(day_rows.order_by('timestamp', 'id').values_list(*EXPORT_FIELDS))
+        write_archive(self.station, STUB_EPOCH.date(), rows)
+        delete_in_batches(day_rows.filter(id__lte=rows[1][0]), batch_size=1)
+        self.assertEqual(day_rows.count(), 2)
+
+        archived, deleted = prune_station(self.station, self.cutoff)
+        self.assertEqual((archived, deleted), (4, 6))
+        self.assertEqual(ReadingArchive.objects.filter(station=self.station, day=STUB_EPOCH.date()).count(), 1)
+        exported = self.exported(f'&station={self.station.pk}')
+        self.assertEqual(len(exported), 12)
+        self.assertEqual(len({row['id'] for row in exported}), 12)
+
+    def test_dry_run(self):
+        out = io.StringIO()
+        call_command('apply_retention', '--days', '30', '--dry-run', stdout=out)
+        self.assertIn('24 readings to remove', out.getvalue())
+        self.assertEqual(AirQualityReading.objects.count(), 24)
+        self.assertFalse(ReadingArchive.objects.exists())
+        self.assertFalse(AirStation.objects.exclude(pruned_before=None).exists())
+
+    def test_export_merges_archived_and_live(self):
+        before = self.exported()
+        for station in self.stations:
+            prune_station(station, self.cutoff)
+        after = self.exported()
+        self.assertEqual(after, before)
+        self.assertEqual(len(after), 24)
+        self.assertEqual([(row['timestamp'], row['id']) for row in after],
+                         sorted((row['timestamp'], row['id']) for row in after))
+
+    def test_reingest_after_prune(self):
+        before = self.exported(f'&station={self.station.pk}')
+        prune_station(self.station, self.cutoff)
+        items = [stub_measurement('PMS', i, STUB_EPOCH + i * datetime.timedelta(hours=6)) for i in range(12)]
+        result = ingest_items(self.station, items)
+        self.assertEqual(result.inserted, 0)
+        self.assertEqual(result.skipped, 12)
+        self.assertEqual(self.station.readings.count(), 4)
+        # Even a row that got back in by another route is served once
+        AirQualityReading.objects.create(station=self.station, timestamp=STUB_EPOCH, pm25=0, aqi=0)
+        exported = self.exported(f'&station={self.station.pk}')
+        self.assertEqual([(row['timestamp'], row['id']) for row in exported],
+                         [(row['timestamp'], row['id']) for row in before])
+        prune_station(self.station, self.cutoff)
+        self.assertEqual(len(self.exported(f'&station={self.station.pk}')), 12)
+
+
+class RollingWindowTests(TestCase):
+    def setUp(self):
+        self.station = AirStation.objects.create(name='Test Station', location='0,0')
+
+    def ingest_hours(self, first, last):
+        # Three PMS readings per hour over hours [first, last) after STUB_EPOCH
+        step = datetime.timedelta(minutes=20)
+        ingest_items(self.station, [stub_measurement('PMS', i, STUB_EPOCH + i * step) for i in range(first * 3, last * 3)])
+
+    def assert_matches_full(self):
+        # The incrementally refreshed window must equal one built from scratch
+        fields = [field.name for field in RollingWindow._meta.fields if field.name not in ('station', 'updated_at')]
+        incremental = RollingWindow.objects.filter(station=self.station).values(*fields).get()
+        RollingWindow.objects.filter(station=self.station).delete()
+        refresh_window(self.station)
+        full = RollingWindow.objects.filter(station=self.station).values(*fields).get()
+        self.assertEqual(incremental, full)
+        self.assertIsNotNone(full['nowcast_aqi'])
+
+    def test_forward_writes(self):
+        # Batches moving the head within the ring, then past it
+        for first, last in ((0, 5), (5, 6), (6, 20), (20, 60)):
+            self.ingest_hours(first, last)
+            self.assert_matches_full()
+
+    def test_backfill_writes(self):
+        self.ingest_hours(40, 50)
+        # Older hours inside the ring, straddling its start, then entirely before it
+        for first, last in ((30, 40), (20, 28), (0, 10)):
+            self.ingest_hours(first, last)
+            self.assert_matches_full()
+
+    def test_deletes_move_head_back(self):
+        self.ingest_hours(0, 40)
+        for hours in (1, 5, 30):
+            cutoff = STUB_EPOCH + (40 - hours) * datetime.timedelta(hours=1)
+            newest = self.station.readings.order_by('-timestamp').values_list('timestamp', flat=True).first()
+            self.station.readings.filter(timestamp__gte=cutoff).delete()
+            readings_changed(self.station, cutoff, newest)
+            self.assert_matches_full()
+        # A single reading deleted through the API
+        reading = self.station.readings.order_by('-timestamp').first()
+        self.client.delete(f'/api/airquality/readings/{reading.pk}/')
+        self.assert_matches_full()
+
+    def test_nowcast_rules(self):
+        # Two of the three most recent hours are required
+        self.assertIsNone(nowcast([10.0, None, None, 20.0, 20.0]))
+        self.assertEqual(nowcast([None, 10.0, 10.0]), 10.0)
+        # Steady concentrations, and all zeros, average to themselves
+        self.assertEqual(nowcast([12.0] * 12), 12.0)
+        self.assertEqual(nowcast([0.0] * 12), 0.0)
+
+    def test_nowcast_worked_example(self):
+        # EPA procedure: weight factor w = min/max over the 12 hours, floored at 0.5 for PM,
+        # NowCast = sum(w**i * c_i) / sum(w**i) with i = 0 for the most recent hour
+        # Range 10..15: w = 2/3, (10 + 2/3 * 12 + 4/9 * 15) / (1 + 2/3 + 4/9) = 222/19
+        self.assertAlmostEqual(nowcast([10.0, 12.0, 15.0] + [None] * 9), 222 / 19)
+        # Range 10..40 gives w = 0.25, floored to 0.5: (40 + 0.5 * 20 + 0.25 * 10) / 1.75 = 30
+        self.assertAlmostEqual(nowcast([40.0, 20.0, 10.0] + [None] * 9), 30.0)
+        # Missing hours drop out of both sums: (40 + 0.25 * 10) / (1 + 0.25), w floored to 0.5
+        self.assertAlmostEqual(nowcast([40.0, None, 10.0] + [None] * 9), 34.0)
+
+
+class BackfillTests(TestCase):
+    def setUp(self):
+        self.station = AirStation.objects.create(name='Test Station', location='0,0')
+        self.sensor_metadata = {
+            1: {'station': self.station.name, 'station_id': self.station.pk, 'lat': 0, 'lon': 0, 'type': 'PMS'},
+            2: {'station': self.station.name, 'station_id': self.station.pk, 'lat': 0, 'lon': 0, 'type': 'DHT'},
+        }
+        # Three days of hourly measurements per sensor: six shards
+        stub = SensorsAfricaStub(self.sensor_metadata, measurements=72, interval=datetime.timedelta(hours=1))
+        self.stub = stub.start()
+        self.addCleanup(stub.stop)
+        self.fetched = []
+        self.failing = set()
+
+    def run_backfill(self, restart=False):
+        client = SensorsAfricaClient(base_url=self.stub.base_url)
+        original = client.get_json
+
+        def get_json(url, params=None):
+            # First page of each shard: record it, and fail the shards in self.failing
+            if params:
+                shard = (int(params['sensor_id']), params['timestamp__gte'][:10])
+                self.fetched.append(shard)
+                if shard in self.failing:
+                    return None
+            return original(url, params)
+        client.get_json = get_json
+        backfill = Backfill(self.sensor_metadata, STUB_EPOCH, STUB_EPOCH + 3 * ONE_DAY, workers=2, client=client)
+        try:
+            return backfill.run(restart=restart)
+        finally:
+            client.close()
+
+    def test_resume(self):
+        self.failing = {(2, '2025-01-02')}
+        shards = self.run_backfill()
+        self.assertEqual([shard.status for shard in shards].count(BackfillShard.DONE), 5)
+        self.assertEqual(len(self.fetched), 6)
+        self.assertEqual(self.station.readings.count(), 72)
+        # Only the failed shard is fetched again
+        self.failing = set()
+        self.fetched = []
+        shards = self.run_backfill()
+        self.assertEqual(self.fetched, [(2, '2025-01-02')])
+        self.assertTrue(all(shard.status == BackfillShard.DONE for shard in shards))
+        self.assertTrue(all(None not in row for row in stored(self.station)))
+        # Nothing left to do, unless restarted
+        self.fetched = []
+        self.run_backfill()
+        self.assertEqual(self.fetched, [])
+        shards = self.run_backfill(restart=True)
+        self.assertEqual(len(self.fetched), 6)
+        self.assertEqual(sum(shard.inserted for shard in shards), 0)
+        self.assertEqual(self.station.readings.count(), 72)
+
+    def test_starts_at_pruned_before(self):
+        self.station.pruned_before = STUB_EPOCH + ONE_DAY
+        self.station.save(update_fields=['pruned_before'])
+        shards = self.run_backfill()
+        self.assertEqual(len(shards), 4)
+        self.assertTrue(all(shard.start >= self.station.pruned_before for shard in shards))
+        self.assertEqual(sorted({day for _, day in self.fetched}), ['2025-01-02', '2025-01-03'])
+        self.assertFalse(self.station.readings.filter(timestamp__lt=self.station.pruned_before).exists())
+
+
+@override_settings(LIVE_POLL_INTERVAL=0)
+class LiveReadingsTests(TestCase):
+    def setUp(self):
+        self.station = AirStation.objects.create(name='Test Station', location='0,0')
+        self.broker = ReadingBroker()
+        patcher = mock.patch('airquality.live.broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def drain(self, sub):
+        # Let the call_soon_threadsafe offers run, then take what was queued
+        await asyncio.sleep(0)
+        events = []
+        while not sub.queue.empty():
+            events.append(sub.queue.get_nowait())
+        return events
+
+    def test_merged_values_sent_as_update(self):
+        @async_to_sync
+        async def scenario():
+            sub = self.broker.subscribe()
+            await sync_to_async(ingest_items)(self.station, stream('PMS', 1))
+            first = await self.drain(sub)
+            await sync_to_async(ingest_items)(self.station, stream('DHT', 1, datetime.timedelta(seconds=20)))
+            return first, await self.drain(sub)
+        first, second = scenario()
+        self.assertEqual([event for event, _ in first], ['reading'])
+        self.assertIsNone(first[0][1]['temperature'])
+        self.assertEqual([event for event, _ in second], ['update'])
+        self.assertEqual(second[0][1]['id'], first[0][1]['id'])
+        self.assertIsNotNone(second[0][1]['temperature'])
+
+    def test_poll_picks_up_other_writers(self):
+        @async_to_sync
+        async def scenario():
+            sub = self.broker.subscribe()
+            await sync_to_async(self.broker.prime)()
+            # As if written by ingest_daemon in another process: nothing is published directly
+            with mock.patch('airquality.ingestion.publish_readings'):
+                await sync_to_async(ingest_items)(self.station, stream('PMS', 1))
+                await sync_to_async(self.broker.poll_once)()
+                first = await self.drain(sub)
+                await sync_to_async(ingest_items)(self.station, stream('DHT', 1, datetime.timedelta(seconds=20)))
+                await sync_to_async(self.broker.poll_once)()
+                second = await self.drain(sub)
+                await sync_to_async(self.broker.poll_once)()
+                third = await self.drain(sub)
+            return first, second, third
+        first, second, third = scenario()
+        self.assertEqual([event for event, _ in first], ['reading'])
+        self.assertEqual([event for event, _ in second], ['update'])
+        self.assertIsNotNone(second[0][1]['humidity'])
+        self.assertEqual(third, [])
+
+    def test_catch_up_for_all_stations(self):
+        other = AirStation.objects.create(name='Other Station', location='0,0')
+        ingest_items(self.station, stream('PMS', 3))
+        ingest_items(other, stream('PMS', 3))
+        ids = list(AirQualityReading.objects.order_by('id').values_list('id', flat=True))
+        request = RequestFactory().get('/api/airquality/live/', HTTP_LAST_EVENT_ID=str(ids[0]))
+
+        @async_to_sync
+        async def scenario():
+            response = await live_readings(request)
+            content = response.streaming_content
+            chunks = [(await anext(content)).decode() for _ in range(len(ids))]
+            await content.aclose()
+            return chunks
+        chunks = scenario()
+        self.assertEqual(chunks[0], 'retry: 5000\n\n')
+        self.assertEqual([int(chunk.split('\n')[0].removeprefix('id: ')) for chunk in chunks[1:]], ids[1:])
+
+
+class StationSummaryTests(TestCase):
+    def setUp(self):
+        self.station = AirStation.objects.create(name='Test Station', location='0,0')
+
+    def assert_summary(self):
+        # The summary kept by the write paths must equal a full recount
+        fields = ['reading_count', 'first_timestamp', 'last_timestamp', 'latest_reading']
+        kept = AirStation.objects.filter(pk=self.station.pk).values(*fields).get()
+        station = AirStation.objects.get(pk=self.station.pk)
+        station.refresh_summary()
+        self.assertEqual(kept, AirStation.objects.filter(pk=self.station.pk).values(*fields).get())
+
+    def test_ingest_extends_without_recount(self):
+        ingest_items(self.station, stream('PMS', 10)[5:])
+        self.assert_summary()
+        # Older rows, newer rows, and values merged into stored rows
+        for items in (stream('PMS', 5), stream('PMS', 20)[10:], stream('DHT', 20, datetime.timedelta(seconds=20))):
+            with CaptureQueriesContext(connection) as queries:
+                ingest_items(self.station, items)
+            recounts = [q['sql'] for q in queries.captured_queries if 'COUNT("airquality_airqualityreading"."id")' in q['sql']]
+            self.assertEqual(recounts, [])
+            self.assert_summary()
+
+    def test_push_and_api_writes(self):
+        body = '\n'.join(json.dumps({'station': 'Test Station', 'timestamp': 1735689600 + i * 60, 'pm25': i}) for i in range(5))
+        self.client.post('/api/airquality/readings/push/', body, content_type='application/x-ndjson')
+        self.assert_summary()
+        response = self.client.post('/api/airquality/readings/', {
+            'station': self.station.pk, 'timestamp': '2026-01-01T00:00:00Z', 'pm25': 12,
+        }, content_type='application/json')
+        self.assert_summary()
+        url = f"/api/airquality/readings/{response.json()['id']}/"
+        self.client.patch(url, {'pm10': 30}, content_type='application/json')
+        self.assert_summary()
+        # Moving and deleting the latest reading fall back to a recount
+        self.client.patch(url, {'timestamp': '2024-01-01T00:00:00Z'}, content_type='application/json')
+        self.assert_summary()
+        self.client.delete(url)
+        self.assert_summary()
+
+
+class FastSerializerTests(TestCase):
+    def setUp(self):
+        self.station = AirStation.objects.create(name='Test Station', location='0,0')
+        nairobi = datetime.timezone(datetime.timedelta(hours=3))
+        AirQualityReading.objects.bulk_create([
+            # Whole seconds, microseconds, and an aware time outside UTC
+            AirQualityReading(station=self.station, timestamp=STUB_EPOCH, pm25=12.5, pm10=20.0, aqi=52.0,
+                              pm1=3.0, temperature=21.5, humidity=60.0),
+            AirQualityReading(station=self.station, timestamp=STUB_EPOCH + datetime.timedelta(microseconds=123456),
+                              pm25=None, pm10=None, aqi=None),
+            AirQualityReading(station=self.station, timestamp=datetime.datetime(2025, 1, 1, 9, 30, 0, 500, tzinfo=nairobi),
+                              temperature=0.0, humidity=None),
+        ])
+
+    def assert_parity(self):
+        readings = AirQualityReading.objects.order_by('timestamp', 'id')
+        expected = AirQualityReadingSerializer(readings, many=True).data
+        fast = AirQualityReadingFastSerializer(readings.values(*FAST_READING_VALUES), many=True).data
+        # Same keys in the same order, same values and types
+        self.assertEqual([list(row.items()) for row in fast], [list(row.items()) for row in expected])
+        self.assertEqual(json.dumps(fast), json.dumps(expected))
+        return expected
+
+    def test_matches_model_serializer(self):
+        expected = self.assert_parity()
+        self.assertEqual([row['timestamp'] for row in expected],
+                         ['2025-01-01T00:00:00Z', '2025-01-01T00:00:00.123456Z', '2025-01-01T06:30:00.000500Z'])
+
+    @override_settings(TIME_ZONE='Africa/Nairobi')
+    def test_matches_in_another_time_zone(self):
+        self.assert_parity()
+
+    def test_list_endpoint(self):
+        response = self.client.get(f'/api/airquality/stations/{self.station.pk}/readings/')
+        readings = AirQualityReading.objects.order_by('timestamp', 'id')
+        self.assertEqual(response.json()['results'], json.loads(json.dumps(AirQualityReadingSerializer(readings, many=True).data)))
+
+
+class WriteBehindTests(TestCase):
+    def setUp(self):
+        # The database side is mocked: the writer thread has its own connection, outside the test transaction
+        self.stored = []
+        patchers = [
+            mock.patch('airquality.writebehind.get_station', side_effect=lambda meta: meta['station_id']),
+            mock.patch('airquality.writebehind.ingest_streams', side_effect=self.ingest_streams),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.meta = {1: {'station': 'One', 'station_id': 1}, 2: {'station': 'Two', 'station_id': 2}}
+
+    def ingest_streams(self, station, streams):
+        self.stored.append((station, [len(items) for items in streams]))
+        return IngestResult(sum(len(items) for items in streams), 0)
+
+    def test_drops_when_full(self):
+        writer = WriteBehindWriter(maxsize=2)
+        with mock.patch.object(writer, '_ensure_thread'):
+            self.assertTrue(writer.submit(self.meta[1], stream('PMS', 3)))
+            self.assertTrue(writer.submit(self.meta[1], stream('PMS', 3)))
+            self.assertFalse(writer.submit(self.meta[1], stream('PMS', 4)))
+        self.assertEqual(writer.dropped, 4)
+        self.assertEqual(writer.queue.qsize(), 2)
+
+    def test_batches_by_size_and_interval(self):
+        writer = WriteBehindWriter(batch_size=5, flush_interval=0.2)
+        with mock.patch.object(writer, '_ensure_thread'):
+            for _ in range(3):
+                writer.submit(self.meta[1], stream('PMS', 3))
+        # Full batch: returned as soon as five items are in, not after the interval
+        started = time.monotonic()
+        self.assertEqual(len(writer._collect()), 2)
+        self.assertLess(time.monotonic() - started, 0.2)
+        # Short batch: returned when the interval is up
+        started = time.monotonic()
+        self.assertEqual(len(writer._collect()), 1)
+        self.assertEqual(len(writer._collect()), 0)
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+    def test_close_flushes(self):
+        writer = WriteBehindWriter(flush_interval=0.5)
+        writer.submit(self.meta[1], stream('PMS', 3))
+        writer.submit(self.meta[2], stream('PMS', 2))
+        writer.submit(self.meta[1], stream('DHT', 3))
+        self.assertTrue(writer.close(timeout=5))
+        self.assertEqual(sorted(self.stored), [(1, [3, 3]), (2, [2])])
+        self.assertFalse(writer._thread.is_alive())
+
+    def test_thread_survives_ingest_errors(self):
+        writer = WriteBehindWriter(flush_interval=0.05)
+        with mock.patch('airquality.writebehind.ingest_streams', side_effect=RuntimeError('database down')), \
+                self.assertLogs('airquality.writebehind', 'ERROR'):
+            writer.submit(self.meta[1], stream('PMS', 3))
+            self.assertTrue(writer.flush(timeout=5))
+        writer.submit(self.meta[2], stream('PMS', 2))
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertTrue(writer._thread.is_alive())
+        self.assertEqual(self.stored, [(2, [2])])
+        writer.close(timeout=5)
+
+
+def read_columnar(data):
+    # Decode an AQCOL1 stream back into EXPORT_FIELDS tuples, as a client would
+    assert data.startswith(COLUMNAR_MAGIC)
+    offset = len(COLUMNAR_MAGIC)
+    names = []
+    rows = []
+    while True:
+        count, new_names = struct.unpack_from('<II', data, offset)
+        offset += 8
+        if not count:
+            return rows
+        for _ in range(new_names):
+            (length,) = struct.unpack_from('<H', data, offset)
+            names.append(data[offset + 2:offset + 2 + length].decode('utf-8'))
+            offset += 2 + length
+        columns = []
+        for dtype in ['<i8', '<u4', '<i8'] + ['<f8'] * (len(EXPORT_FIELDS) - 3):
+            column = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            offset += column.nbytes
+            columns.append(column.tolist())
+        for reading_id, station, micros, *metrics in zip(*columns):
+            timestamp = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(microseconds=micros)
+            rows.append((reading_id, names[station], timestamp, *(None if v != v else v for v in metrics)))
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        stations = [AirStation.objects.create(name=name, location='0,0') for name in ('Station A', 'Stäti😀n B')]
+        AirQualityReading.objects.bulk_create([
+            AirQualityReading(
+                station=station, timestamp=STUB_EPOCH + i * datetime.timedelta(minutes=30, microseconds=7),
+                pm25=None if i % 5 == 0 else float(i), pm10=float(i * 2), aqi=None if i % 5 == 0 else float(i * 3),
+                temperature=-1.5 if i % 2 else None,
+            )
+            for i in range(30) for station in stations
+        ])
+        self.station = stations[1]
+
+    def export(self, fmt, query=''):
+        response = self.client.get(f'/api/airquality/readings/export/?format={fmt}{query}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_columnar_round_trip(self):
+        rows = list(AirQualityReading.objects.order_by('timestamp', 'id').values_list(*EXPORT_FIELDS))
+        # Small chunks, so names are spread over several blocks' dictionaries
+        chunks = [rows[i:i + 7] for i in range(0, len(rows), 7)]
+        self.assertEqual(read_columnar(b''.join(stream_columnar(chunks))), rows)
+        self.assertEqual(read_columnar(self.export('columnar')), rows)
+        self.assertEqual(read_columnar(b''.join(stream_columnar([]))), [])
+
+    def test_formats_agree(self):
+        rows = read_columnar(self.export('columnar'))
+        records = [json.loads(line) for line in self.export('ndjson').decode().splitlines()]
+        self.assertEqual([list(record) for record in records], [EXPORT_COLUMNS] * len(rows))
+        self.assertEqual([tuple(record.values()) for record in records],
+                         [(row[0], row[1], row[2].isoformat(), *row[3:]) for row in rows])
+        lines = list(csv.reader(io.StringIO(self.export('csv').decode())))
+        self.assertEqual(lines[0], EXPORT_COLUMNS)
+        self.assertEqual([int(line[0]) for line in lines[1:]], [row[0] for row in rows])
+
+    def test_filters_and_order_match_list(self):
+        query = f'&station={self.station.pk}&aqi_gte=10&aqi_lte=60&start=2025-01-01T03:00:00Z&end=2025-01-01T12:00:00Z'
+        listed = self.client.get(f'/api/airquality/readings/?page_size=1000{query}').json()['results']
+        self.assertTrue(listed)
+        exported = [json.loads(line) for line in self.export('ndjson', query).decode().splitlines()]
+        self.assertEqual([row['id'] for row in exported], [row['id'] for row in listed])
+        self.assertEqual([row[0] for row in read_columnar(self.export('columnar', query))], [row['id'] for row in listed])
+
+
+class MetricsAccessTests(TestCase):
+    def test_loopback_only_by_default(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.5').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='s3cret', METRICS_ALLOWED_IPS=[])
+    def test_bearer_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.5', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
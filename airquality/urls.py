@@ -1,15 +1,20 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import AirStationViewSet, AirQualityReadingViewSet, SensorNowProxy, AirQualityReadingExportView, StationReadingsByIdView, StationReadingsByNameView
+from .live import live_readings
+from .views import AirStationViewSet, AirQualityReadingViewSet, SensorNowProxy, AirQualityReadingExportView, ReadingPushView, StationReadingsByIdView, StationReadingsByNameView, StationAggregatesView
 
 router = DefaultRouter()
 router.register(r'stations', AirStationViewSet)
 router.register(r'readings', AirQualityReadingViewSet)
 
 urlpatterns = [
+    # These must come before the router, whose readings/<pk>/ route would swallow them
+    path('readings/export/', AirQualityReadingExportView.as_view()),
+    path('readings/push/', ReadingPushView.as_view()),
     path('', include(router.urls)),
     path('proxy/now/', SensorNowProxy.as_view()),
-    path('readings/export/', AirQualityReadingExportView.as_view()),
+    path('live/', live_readings),
     path('stations/<int:station_id>/readings/', StationReadingsByIdView.as_view()),
     path('stations/name/<str:station_name>/readings/', StationReadingsByNameView.as_view()),
+    path('stations/<int:station_id>/aggregates/', StationAggregatesView.as_view()),
 ] 
\ No newline at end of file
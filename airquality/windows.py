@@ -0,0 +1,135 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncHour
+
+from .aqi import compute_aqi
+from .merge import EPOCH
+from .models import AirStation, AirQualityReading, RollingWindow
+from .rollups import bucket_floor
+
+# Metrics with trailing averages, in bucket order after the hour
+WINDOW_METRICS = ['pm25', 'pm10']
+# Trailing averages kept, in hours; the ring holds the longest
+WINDOW_HOURS = [1, 8, 24]
+RING_HOURS = max(WINDOW_HOURS)
+# Hourly averages weighed by NowCast
+NOWCAST_HOURS = 12
+
+ONE_HOUR = datetime.timedelta(hours=1)
+
+
+def _epoch(ts):
+    return int((ts - EPOCH).total_seconds())
+
+
+def hourly_sums(station, lower, upper):
+    # {hour start (epoch seconds): [sum, count per WINDOW_METRICS]} for readings in [lower, upper)
+    aggregates = {}
+    for metric in WINDOW_METRICS:
+        aggregates[f'{metric}_sum'] = Sum(metric)
+        aggregates[f'{metric}_count'] = Count(metric)
+    rows = (
+        AirQualityReading.objects.filter(station=station, timestamp__gte=lower, timestamp__lt=upper)
+        .annotate(hour=TruncHour('timestamp', tzinfo=datetime.timezone.utc))
+        .values('hour').annotate(**aggregates).order_by()
+    )
+    buckets = {}
+    for row in rows:
+        values = []
+        for metric in WINDOW_METRICS:
+            values.extend([row[f'{metric}_sum'] or 0.0, row[f'{metric}_count']])
+        buckets[_epoch(row['hour'])] = values
+    return buckets
+
+
+def nowcast(hourly):
+    """
+    US EPA NowCast of hourly average concentrations, most recent hour
+    first, None for hours without data. Needs two of the three most recent
+    hours; the weight factor is min/max of the hours, at least 0.5.
+    """
+    if sum(c is not None for c in hourly[:3]) < 2:
+        return None
+    known = [(age, c) for age, c in enumerate(hourly) if c is not None]
+    highest = max(c for _, c in known)
+    lowest = min(c for _, c in known)
+    weight = max(lowest / highest, 0.5) if highest > 0 else 1.0
+    return sum(weight ** age * c for age, c in known) / sum(weight ** age for age, _ in known)
+
+
+def window_values(ring, head):
+    """
+    Trailing averages and NowCast from a ring of hourly sums ending with the
+    `head` hour (epoch seconds). Reading-weighted: an average is the sum
+    over the window's hours divided by their count.
+    """
+    values = {}
+    for i, metric in enumerate(WINDOW_METRICS):
+        for hours in WINDOW_HOURS:
+            since = head - (hours - 1) * 3600
+            total = sum(bucket[2 * i] for hour, bucket in ring.items() if hour >= since)
+            count = sum(bucket[2 * i + 1] for hour, bucket in ring.items() if hour >= since)
+            values[f'{metric}_{hours}h'] = total / count if count else None
+        hourly = []
+        for age in range(NOWCAST_HOURS):
+            bucket = ring.get(head - age * 3600)
+            hourly.append(bucket[2 * i] / bucket[2 * i + 1] if bucket and bucket[2 * i + 1] else None)
+        values[f'nowcast_{metric}'] = nowcast(hourly)
+    values['nowcast_aqi'] = compute_aqi(values['nowcast_pm25'], values['nowcast_pm10'])
+    return values
+
+
+def refresh_window(station, start=None, end=None):
+    """
+    Bring the station's RollingWindow up to date after writes between
+    `start` and `end` (the whole window when not given). Windows end with
+    the hour of the station's newest reading. Only the hours touched by
+    the writes, and hours new to the window, are aggregated again from
+    readings; the rest of the ring is reused, so cost follows the batch
+    rather than the 24-hour window. Returns the window.
+    """
+    with transaction.atomic():
+        # Locked so concurrent writers to a station don't save each other's stale ring
+        window, _ = RollingWindow.objects.select_for_update().get_or_create(station=station)
+        # Read fresh, like the rollups' retention cutoff: callers may hold an old station object
+        last = AirStation.objects.filter(pk=station.pk).values_list('last_timestamp', flat=True).first()
+        if last is None:
+            # No readings left: empty windows
+            window.as_of = None
+            window.buckets = []
+            values = window_values({}, 0)
+        else:
+            head = bucket_floor(last, 'hour')
+            ring = _refresh_ring(station, window, head, start, end)
+            window.as_of = head
+            window.buckets = [[hour, *ring[hour]] for hour in sorted(ring)]
+            values = window_values(ring, _epoch(head))
+        for field, value in values.items():
+            setattr(window, field, value)
+        window.save()
+    return window
+
+
+def _refresh_ring(station, window, head, start, end):
+    # The window's ring moved to end at `head`, with the hours the writes touched aggregated again
+    first = head - (RING_HOURS - 1) * ONE_HOUR
+    ring = {bucket[0]: bucket[1:] for bucket in window.buckets}
+    # Hour ranges to aggregate: the writes, and whatever the previous ring didn't cover
+    if window.as_of is None or start is None or end is None:
+        stale = [(first, head)]
+    else:
+        covered_first = window.as_of - (RING_HOURS - 1) * ONE_HOUR
+        stale = [
+            (max(bucket_floor(start, 'hour'), first), min(bucket_floor(end, 'hour'), head)),
+            (first, min(covered_first - ONE_HOUR, head)),
+            (max(window.as_of + ONE_HOUR, first), head),
+        ]
+    stale = [(lower, upper) for lower, upper in stale if lower <= upper]
+    if stale:
+        lower = min(lower for lower, _ in stale)
+        upper = max(upper for _, upper in stale)
+        ring = {hour: bucket for hour, bucket in ring.items() if not _epoch(lower) <= hour <= _epoch(upper)}
+        ring.update(hourly_sums(station, lower, upper + ONE_HOUR))
+    return {hour: bucket for hour, bucket in ring.items() if _epoch(first) <= hour <= _epoch(head)}
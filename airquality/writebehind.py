@@ -0,0 +1,155 @@
+from collections import OrderedDict
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from .ingestion import get_station, ingest_streams
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindWriter:
+    """
+    Bounded buffer of upstream items waiting to be stored, drained by one
+    background thread.
+
+    Request paths hand items over with submit() and return without touching
+    the database. The thread collects everything queued within
+    `flush_interval` seconds, or up to `batch_size` items, and stores it
+    with one ingest_streams() call per station, merging its sensors. When
+    the buffer is full new items are dropped: they are re-fetched upstream
+    on a later refresh or by ingest_daemon, so a backlog can't grow
+    without bound.
+    """
+
+    def __init__(self, maxsize=None, batch_size=None, flush_interval=None):
+        self.queue = queue.Queue(maxsize=maxsize or getattr(settings, 'WRITE_BEHIND_QUEUE_SIZE', 256))
+        self.batch_size = batch_size or getattr(settings, 'WRITE_BEHIND_BATCH_SIZE', 1000)
+        self.flush_interval = flush_interval if flush_interval is not None else getattr(settings, 'WRITE_BEHIND_FLUSH_INTERVAL', 2)
+        self.stations = {}
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def submit(self, meta, items):
+        # meta is a registry.sensor_metadata() entry naming the station; returns False if the items were dropped
+        if not items:
+            return True
+        self._ensure_thread()
+        try:
+            self.queue.put_nowait((meta, items))
+        except queue.Full:
+            self.dropped += len(items)
+            logger.warning(f"Write-behind queue full; dropped {len(items)} items for {meta['station']}")
+            return False
+        return True
+
+    def _ensure_thread(self):
+        # Started lazily so each forked worker gets its own thread
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stopping.clear()
+                    self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        # Wait for the first entry, then gather more until the batch is full or the interval is up
+        try:
+            entries = [self.queue.get(timeout=self.flush_interval or None)]
+        except queue.Empty:
+            return []
+        count = len(entries[0][1])
+        deadline = time.monotonic() + self.flush_interval
+        while count < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            entries.append(entry)
+            count += len(entry[1])
+        return entries
+
+    def _run(self):
+        try:
+            while not (self._stopping.is_set() and self.queue.empty()):
+                entries = self._collect()
+                if entries:
+                    self.write(entries)
+        finally:
+            connection.close()
+
+    def write(self, entries):
+        # Group the entries per station so each station costs one merge and bulk insert per batch
+        close_old_connections()
+        by_station = OrderedDict()
+        for meta, items in entries:
+            by_station.setdefault(meta['station_id'], (meta, []))[1].append(items)
+        try:
+            for station_id, (meta, streams) in by_station.items():
+                name = meta['station']
+                try:
+                    if station_id not in self.stations:
+                        self.stations[station_id] = get_station(meta)
+                    result = ingest_streams(self.stations[station_id], streams)
+                    logger.info(f"Stored for {name}: {result.inserted} inserted, {result.merged} merged, {result.skipped} skipped")
+                except Exception:
+                    logger.exception(f"Write-behind flush failed for {name}")
+        finally:
+            for _ in entries:
+                self.queue.task_done()
+
+    def flush(self, timeout=None):
+        """
+        Wait until everything submitted so far is stored. Returns False if
+        `timeout` seconds pass first.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            # No thread to do it (e.g. it was never started in this process): drain inline
+            while True:
+                try:
+                    entry = self.queue.get_nowait()
+                except queue.Empty:
+                    return True
+                self.write([entry])
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        # Flush what is queued, then let the thread exit
+        timeout = getattr(settings, 'WRITE_BEHIND_SHUTDOWN_TIMEOUT', 30) if timeout is None else timeout
+        flushed = self.flush(timeout)
+        if not flushed:
+            logger.warning(f'Write-behind queue not flushed within {timeout}s; {self.queue.qsize()} entries lost')
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(self.flush_interval + 1)
+        return flushed
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    # Process-wide writer, flushed when the process exits
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = WriteBehindWriter()
+                atexit.register(_writer.close)
+    return _writer